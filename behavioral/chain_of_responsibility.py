@@ -23,8 +23,19 @@
 
 '''
 
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import weakref
 from abc import ABCMeta, abstractmethod
+from collections import deque
 from enum import Enum
+from functools import partial
 
 
 class LogLevel(Enum):
@@ -41,13 +52,156 @@ class LogLevel(Enum):
     ALL = 7
 
 
+class BackgroundWriter(object):
+    """
+    Bounded queue drained in batches by a background worker thread.
+
+    Producers only pay for a queue append; the worker hands batches of
+    ``(msg, severity, timestamp)`` records to ``write_batch`` when ``batch_size`` messages are queued, when
+    ``flush_interval`` seconds have passed, or when ``flush`` is called.
+    """
+    BLOCK = "block"
+    DROP_OLDEST = "drop-oldest"
+    DROP_NEWEST = "drop-newest"
+
+    def __init__(self, write_batch, max_queue=10000, batch_size=500,
+                 flush_interval=0.1, overflow=BLOCK):
+        """
+        Start a new background writer.
+
+        Args:
+            write_batch (callable): Called with a list of
+                (msg, severity, timestamp) records, stamped when queued.
+            max_queue (int): Maximum number of queued messages.
+            batch_size (int): Maximum number of messages per batch.
+            flush_interval (float): Seconds a message may wait in the queue.
+            overflow (str): Policy when the queue is full, one of BLOCK,
+                DROP_OLDEST or DROP_NEWEST.
+
+        Raises:
+            ValueError: If the overflow policy is unknown.
+        """
+        if overflow not in (self.BLOCK, self.DROP_OLDEST, self.DROP_NEWEST):
+            raise ValueError("Unknown overflow policy: {}".format(overflow))
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.dropped = 0
+        self.errors = 0
+        self._write_batch = write_batch
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._unfinished = 0
+        self._flushing = 0
+        self._closed = False
+        self._redirect = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, msg, severity=LogLevel.NONE):
+        """
+        Queue a message for the background worker.
+
+        Args:
+            msg (str): Message string.
+            severity (LogLevel): Severity of message as log level enum.
+
+        Raises:
+            ValueError: If the writer has been closed without ``redirect``.
+        """
+        with self._cond:
+            queue = self._queue
+            if not self._closed and len(queue) >= self.max_queue:
+                if self.overflow == self.DROP_NEWEST:
+                    self.dropped += 1
+                    return
+                if self.overflow == self.DROP_OLDEST:
+                    queue.popleft()
+                    self.dropped += 1
+                    self._unfinished -= 1
+                else:
+                    while (len(queue) >= self.max_queue
+                           and not self._closed):
+                        self._cond.wait()
+            # Checked again after waiting: the worker may have exited since.
+            if not self._closed:
+                queue.append((msg, severity, time.time()))
+                self._unfinished += 1
+                if len(queue) == self.batch_size:
+                    self._cond.notify_all()
+                return
+            if not self._redirect:
+                raise ValueError("Writer is closed.")
+        self._write_batch([(msg, severity, time.time())])
+
+    def flush(self):
+        """
+        Block until every queued message has been written.
+        """
+        with self._cond:
+            self._flushing += 1
+            self._cond.notify_all()
+            while self._unfinished:
+                self._cond.wait()
+            self._flushing -= 1
+
+    def close(self, redirect=False):
+        """
+        Flush pending messages and stop the worker thread.
+
+        Args:
+            redirect (bool): Write messages put after closing synchronously
+                with ``write_batch`` instead of raising ValueError.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._redirect = redirect
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        cond = self._cond
+        queue = self._queue
+        while True:
+            with cond:
+                if (len(queue) < self.batch_size and not self._flushing
+                        and not self._closed):
+                    cond.wait(self.flush_interval)
+                if not queue:
+                    if self._closed:
+                        return
+                    continue
+                batch = [
+                    queue.popleft()
+                    for _ in range(min(len(queue), self.batch_size))
+                ]
+                # Wake producers blocked on a full queue.
+                cond.notify_all()
+            try:
+                self._write_batch(batch)
+            except Exception:
+                self.errors += 1
+            with cond:
+                self._unfinished -= len(batch)
+                cond.notify_all()
+
+
 class Logger:
     """
     Abstract handler in chain of responsibility pattern.
     """
     __metaclass__ = ABCMeta
 
-    next = None
+    _next = None
+    # Compiled dispatch table: severity -> tuple of bound writers.
+    _dispatch = None
+    # Writers that accept any severity, used for values outside LogLevel.
+    _catch_all = ()
+    # BackgroundWriter draining this logger, if running in background mode.
+    background = None
 
     def __init__(self, levels):
         """
@@ -57,10 +211,30 @@ class Logger:
             levels (list[str]): List of log levels.
         """
         self.log_levels = []
+        # Loggers whose next is this one, used to invalidate the compiled
+        # dispatch tables of every chain going through it.
+        self._prevs = weakref.WeakSet()
 
         for level in levels:
             self.log_levels.append(level)
 
+    @property
+    def next(self):
+        """
+        Next responsible logger in the chain; assigning it rewires the chain
+        like ``set_next``.
+        """
+        return self._next
+
+    @next.setter
+    def next(self, next_logger):
+        if self._next is not None:
+            self._next._prevs.discard(self)
+        self._next = next_logger
+        if next_logger is not None:
+            next_logger._prevs.add(self)
+        self.invalidate()
+
     def set_next(self, next_logger):
         """
         Set next responsible logger in the chain.
@@ -74,10 +248,98 @@ class Logger:
         self.next = next_logger
         return self.next
 
-    def message(self, msg, severity):
+    def invalidate(self):
+        """
+        Drop the compiled dispatch table of this logger and of every logger
+        before it, in every chain reaching it. Call it after mutating
+        ``log_levels`` by hand.
+        """
+        seen = set()
+        stack = [self]
+        while stack:
+            logger = stack.pop()
+            if logger in seen:
+                continue
+            seen.add(logger)
+            logger._dispatch = None
+            stack.extend(logger._prevs)
+
+    def _compile(self):
+        """
+        Compile the chain starting at this logger into a dispatch table.
+
+        Returns:
+            dict[LogLevel, tuple]: Writers accepting each severity, in chain
+            order.
+        """
+        handlers = []
+        logger = self
+        while logger is not None:
+            handlers.append(logger)
+            logger = logger.next
+
+        dispatch = {}
+        for severity in LogLevel:
+            dispatch[severity] = tuple(
+                handler.writer_for(severity) for handler in handlers
+                if LogLevel.ALL in handler.log_levels
+                or severity in handler.log_levels
+            )
+        self._catch_all = tuple(
+            handler.writer_for(LogLevel.NONE) for handler in handlers
+            if LogLevel.ALL in handler.log_levels
+        )
+        self._dispatch = dispatch
+        return dispatch
+
+    def is_enabled_for(self, severity):
+        """
+        Check whether any logger in the chain accepts a severity.
+
+        Args:
+            severity (LogLevel): Severity of message as log level enum.
+
+        Returns:
+            bool: True if a message of this severity would be written.
+        """
+        dispatch = self._dispatch
+        if dispatch is None:
+            dispatch = self._compile()
+        return bool(dispatch.get(severity, self._catch_all))
+
+    def message(self, msg, severity, *args):
         """
         Message writer handler.
 
+        The message is only formatted, once, if some logger in the chain
+        accepts the severity.
+
+        Args:
+            msg (str|callable): Message string, format string for ``args``
+                or zero-argument callable returning the message.
+            severity (LogLevel): Severity of message as log level enum.
+            *args: Values interpolated into ``msg`` with ``%``.
+        """
+        dispatch = self._dispatch
+        if dispatch is None:
+            dispatch = self._compile()
+        writers = dispatch.get(severity, self._catch_all)
+        if not writers:
+            return
+        if args:
+            msg = msg % args
+        elif callable(msg):
+            msg = msg()
+        for write in writers:
+            write(msg)
+
+    def walk_message(self, msg, severity):
+        """
+        Message writer handler walking the chain one logger at a time.
+
+        This is the uncompiled form of ``message``, kept as a reference for
+        benchmarks.
+
         Args:
             msg (str): Message string.
             severity (LogLevel): Severity of message as log level enum.
@@ -86,7 +348,7 @@ class Logger:
             self.write_message(msg)
 
         if self.next is not None:
-            self.next.message(msg, severity)
+            self.next.walk_message(msg, severity)
 
     @abstractmethod
     def write_message(self, msg):
@@ -101,6 +363,69 @@ class Logger:
         """
         raise NotImplementedError("You should implement this method.")
 
+    def writer_for(self, severity):
+        """
+        Callable used by the dispatch table to write messages of a severity.
+        Sinks recording the severity override it.
+
+        Args:
+            severity (LogLevel): Severity of message as log level enum.
+
+        Returns:
+            callable: Function taking the message string.
+        """
+        return self.write_message
+
+    def write_messages(self, records):
+        """
+        Write a batch of records. Sinks with a cheaper bulk path should
+        override it.
+
+        Args:
+            records (list[tuple[str, LogLevel, float]]): Messages,
+                severities and the times they were logged.
+        """
+        write = type(self).write_message
+        for msg, _, _ in records:
+            write(self, msg)
+
+    def run_in_background(self, **options):
+        """
+        Switch this logger to background mode: messages are queued and
+        written in batches by a worker thread.
+
+        Args:
+            **options: Keyword arguments for BackgroundWriter.
+
+        Returns:
+            BackgroundWriter: The writer draining this logger.
+        """
+        if self.background is None:
+            self.background = BackgroundWriter(self.write_messages, **options)
+            self.write_message = self.background.put
+            self.invalidate()
+        return self.background
+
+    def flush(self):
+        """
+        Block until messages queued in background mode have been written.
+        """
+        if self.background is not None:
+            self.background.flush()
+
+    def close(self):
+        """
+        Flush and stop background mode, going back to synchronous writes.
+        """
+        background = self.background
+        if background is not None:
+            # Take put out of the dispatch tables before closing the writer;
+            # callers still holding it get synchronous writes, not errors.
+            self.background = None
+            del self.write_message
+            self.invalidate()
+            background.close(redirect=True)
+
 
 class ConsoleLogger(Logger):
     def write_message(self, msg):
@@ -128,21 +453,321 @@ class FileLogger(Logger):
     """
     Overrides parent's abstract method to write a file.
 
+    Without a path messages are printed. With a path they are appended
+    through a large buffer, synced according to the durability policy and
+    rotated by size or age. Rotation only renames files and swaps the
+    handle; closing the old file and pruning backups happen on a background
+    thread.
+
     Args:
         msg (str): Message string.
     """
-    def write_message(self, msg):
-        print("Writing to log file:", msg)
+    # Binary record header: timestamp, severity value, message length.
+    RECORD = struct.Struct("<dBI")
+
+    def __init__(self, levels, path=None, buffer_size=1 << 20, binary=False,
+                 fsync_records=None, fsync_interval=None, max_bytes=None,
+                 rotate_interval=None, backup_count=5):
+        """
+        Initialize new file logger.
+
+        Args:
+            levels (list[str]): List of log levels.
+            path (str): Log file path, or None to print messages.
+            buffer_size (int): Write buffer size in bytes.
+            binary (bool): Write compact (timestamp, level, message)
+                records instead of text lines.
+            fsync_records (int): Sync to disk every N records.
+            fsync_interval (float): Sync to disk every T milliseconds.
+            max_bytes (int): Rotate once the file reaches this size.
+            rotate_interval (float): Rotate once the file is this many
+                seconds old.
+            backup_count (int): Number of rotated files to keep.
+        """
+        super(FileLogger, self).__init__(levels)
+        self.path = path
+        self.buffer_size = buffer_size
+        self.binary = binary
+        self.fsync_records = fsync_records
+        self.fsync_interval = (
+            fsync_interval / 1000.0 if fsync_interval is not None else None
+        )
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        # Whether any sync or rotation policy needs checking on writes.
+        self._policy = any(option is not None for option in (
+            fsync_records, fsync_interval, max_bytes, rotate_interval
+        ))
+        self._lock = threading.Lock()
+        self._file = None
+        # Threads closing rotated files, joined by close.
+        self._retiring = []
+        if path is not None:
+            self._open()
+
+    def _open(self):
+        self._file = open(self.path, "ab", buffering=self.buffer_size)
+        self._size = self._file.tell()
+        self._opened = time.time()
+        self._unsynced = 0
+        self._synced = time.monotonic()
+
+    def _encode(self, msg, severity, now):
+        if self.binary:
+            data = msg.encode("utf-8")
+            return self.RECORD.pack(now, severity.value, len(data)) + data
+        return "{:.6f} {} {}\n".format(now, severity.name, msg).encode("utf-8")
+
+    def writer_for(self, severity):
+        return partial(self.write_message, severity=severity)
+
+    def write_message(self, msg, severity=LogLevel.NONE):
+        if self.path is None:
+            print("Writing to log file:", msg)
+            return
+        self._append(self._encode(msg, severity, time.time()), 1)
+
+    def write_messages(self, records):
+        if self.path is None:
+            for msg, _, _ in records:
+                print("Writing to log file:", msg)
+            return
+        encode = self._encode
+        self._append(
+            b"".join([
+                encode(msg, severity, logged)
+                for msg, severity, logged in records
+            ]),
+            len(records)
+        )
+
+    def _append(self, data, count):
+        with self._lock:
+            if self._file is None:
+                raise ValueError("Logger is closed.")
+            self._file.write(data)
+            self._size += len(data)
+            if self._policy:
+                self._unsynced += count
+                self._maybe_sync()
+
+    def _maybe_sync(self):
+        if (self.fsync_records is not None
+                and self._unsynced >= self.fsync_records
+                or self.fsync_interval is not None
+                and time.monotonic() - self._synced >= self.fsync_interval):
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self._synced = time.monotonic()
+        if (self.max_bytes is not None and self._size >= self.max_bytes
+                or self.rotate_interval is not None
+                and time.time() - self._opened >= self.rotate_interval):
+            self._rotate()
+
+    def _rotate(self):
+        # Shift path.1 -> path.2 ... like logging's RotatingFileHandler, so
+        # backups keep their order across processes; path.N is overwritten.
+        old_file = self._file
+        if self.backup_count:
+            for index in range(self.backup_count - 1, 0, -1):
+                backup = "{}.{}".format(self.path, index)
+                if os.path.exists(backup):
+                    os.replace(backup, "{}.{}".format(self.path, index + 1))
+            os.replace(self.path, self.path + ".1")
+        else:
+            os.remove(self.path)
+        self._open()
+        retiring = threading.Thread(target=self._retire, args=(old_file,))
+        retiring.start()
+        self._retiring = [
+            thread for thread in self._retiring if thread.is_alive()
+        ]
+        self._retiring.append(retiring)
+
+    def _retire(self, old_file):
+        old_file.flush()
+        if self.fsync_records is not None or self.fsync_interval is not None:
+            os.fsync(old_file.fileno())
+        old_file.close()
+        # Drop backups left beyond backup_count, e.g. by a larger setting.
+        directory, name = os.path.split(os.path.abspath(self.path))
+        for entry in os.listdir(directory):
+            suffix = entry[len(name) + 1:]
+            if (entry.startswith(name + ".") and suffix.isdigit()
+                    and int(suffix) > self.backup_count):
+                os.remove(os.path.join(directory, entry))
+
+    def flush(self):
+        super(FileLogger, self).flush()
+        if self._file is not None:
+            with self._lock:
+                self._file.flush()
+
+    def close(self):
+        super(FileLogger, self).close()
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            retiring, self._retiring = self._retiring, []
+        # Rotated files are synced and closed once close returns.
+        for thread in retiring:
+            thread.join()
+
+    @classmethod
+    def read_records(cls, path):
+        """
+        Read binary records written with ``binary=True``.
+
+        Args:
+            path (str): Log file path.
+
+        Yields:
+            tuple[float, LogLevel, str]: Timestamp, severity and message.
+        """
+        header = cls.RECORD
+        with open(path, "rb") as log_file:
+            data = log_file.read()
+        offset = 0
+        while offset < len(data):
+            now, level, length = header.unpack_from(data, offset)
+            offset += header.size
+            yield (now, LogLevel(level),
+                   data[offset:offset + length].decode("utf-8"))
+            offset += length
 
 class DatabaseLogger(Logger):
     """
-    Overrides parent's abstract method to write a file.
+    Overrides parent's abstract method to write to a database.
+
+    Without a path messages are printed. With a path they are buffered and
+    inserted into SQLite in batches, one ``executemany`` per transaction,
+    over a connection reused by each thread. The database runs in WAL mode
+    so readers do not block the writer.
 
     Args:
         msg (str): Message string.
     """
-    def write_message(self, msg):
-        print("Writing to database:", msg)
+    SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS log ("
+        " id INTEGER PRIMARY KEY,"
+        " timestamp REAL NOT NULL,"
+        " level INTEGER NOT NULL,"
+        " message TEXT NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS log_level ON log (level, timestamp)",
+        "CREATE INDEX IF NOT EXISTS log_timestamp ON log (timestamp)",
+    )
+    INSERT = "INSERT INTO log (timestamp, level, message) VALUES (?, ?, ?)"
+    RECENT = (
+        "SELECT timestamp, level, message FROM log"
+        " WHERE level = ? ORDER BY timestamp DESC LIMIT ?"
+    )
+
+    def __init__(self, levels, path=None, batch_size=1000):
+        """
+        Initialize new database logger.
+
+        Args:
+            levels (list[str]): List of log levels.
+            path (str): SQLite database path, or None to print messages.
+            batch_size (int): Number of buffered rows inserted per
+                transaction.
+        """
+        super(DatabaseLogger, self).__init__(levels)
+        self.path = path
+        self.batch_size = batch_size
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pending = []
+        # Every connection opened by _connection, closed together by close.
+        self._connections = []
+        if path is not None:
+            connection = self._connection()
+            connection.execute("PRAGMA journal_mode=WAL")
+            with connection:
+                for statement in self.SCHEMA:
+                    connection.execute(statement)
+
+    def _connection(self):
+        """
+        Connection of the calling thread, opened on first use. sqlite3
+        caches the prepared INSERT and SELECT statements per connection.
+        """
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            # Only this thread uses it, but close() may run in another.
+            connection = sqlite3.connect(
+                self.path, cached_statements=16, check_same_thread=False
+            )
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def writer_for(self, severity):
+        return partial(self.write_message, severity=severity)
+
+    def write_message(self, msg, severity=LogLevel.NONE):
+        if self.path is None:
+            print("Writing to database:", msg)
+            return
+        with self._lock:
+            self._pending.append((time.time(), severity.value, msg))
+            if len(self._pending) < self.batch_size:
+                return
+            rows, self._pending = self._pending, []
+        self._insert(rows)
+
+    def write_messages(self, records):
+        if self.path is None:
+            for msg, _, _ in records:
+                print("Writing to database:", msg)
+            return
+        self._insert([
+            (logged, severity.value, msg) for msg, severity, logged in records
+        ])
+
+    def _insert(self, rows):
+        connection = self._connection()
+        with connection:
+            connection.executemany(self.INSERT, rows)
+
+    def recent(self, severity, limit=100):
+        """
+        Most recent messages of a severity, newest first.
+
+        Args:
+            severity (LogLevel): Severity of message as log level enum.
+            limit (int): Maximum number of rows.
+
+        Returns:
+            list[tuple[float, LogLevel, str]]: Timestamp, severity and
+            message.
+        """
+        self.flush()
+        rows = self._connection().execute(
+            self.RECENT, (severity.value, limit)
+        )
+        return [(now, LogLevel(level), msg) for now, level, msg in rows]
+
+    def flush(self):
+        super(DatabaseLogger, self).flush()
+        with self._lock:
+            rows, self._pending = self._pending, []
+        if rows:
+            self._insert(rows)
+
+    def close(self):
+        super(DatabaseLogger, self).close()
+        self.flush()
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for connection in connections:
+            connection.close()
 
 def main():
     """
@@ -165,6 +790,8 @@ def main():
     # has a log level of all
     logger.message("Entering function ProcessOrder().", LogLevel.DEBUG)
     logger.message("Order record retrieved.", LogLevel.INFO)
+    # Formatting is deferred until a logger accepts the message.
+    logger.message("Order %s has %d lines.", LogLevel.INFO, "ORD1", 3)
 
     # ConsoleLogger and FileLogger will handle this part since file logger
     # implements WARNING and ERROR
@@ -186,5 +813,149 @@ def main():
     logger.message("OrderDispatched.", LogLevel.FUNCTIONAL_MESSAGE)
 
 
+class NullLogger(Logger):
+    """
+    Logger discarding every message, used to measure dispatch overhead.
+    """
+    def write_message(self, msg):
+        pass
+
+
+def benchmark(number=100000):
+    """
+    Compare the compiled dispatch table against the recursive chain walk.
+
+    Args:
+        number (int): Messages sent per severity.
+    """
+    logger = NullLogger([LogLevel.ALL])
+    logger.set_next(
+        NullLogger([LogLevel.FUNCTIONAL_MESSAGE, LogLevel.FUNCTIONAL_ERROR])
+    ).set_next(
+        NullLogger([LogLevel.WARNING, LogLevel.ERROR])
+    ).set_next(
+        NullLogger([LogLevel.WARNING, LogLevel.ERROR])
+    )
+
+    for name, handler in (("walk", logger.walk_message),
+                          ("compiled", logger.message)):
+        elapsed = 0.0
+        for severity in LogLevel:
+            elapsed += timeit.timeit(
+                lambda: handler("msg", severity), number=number
+            )
+        total = number * len(LogLevel)
+        print("{:>10}: {:.3f}s, {:,.0f} msg/s".format(
+            name, elapsed, total / elapsed
+        ))
+
+    logger = ConsoleLogger([LogLevel.ALL])
+    logger.write_messages = lambda records: None
+    logger.run_in_background(max_queue=100000, batch_size=1000)
+    elapsed = timeit.timeit(
+        lambda: logger.message("msg", LogLevel.ERROR), number=number
+    )
+    logger.close()
+    print("{:>10}: {:.3f}s, {:,.0f} msg/s".format(
+        "background", elapsed, number / elapsed
+    ))
+
+
+def benchmark_file(lines=1000000):
+    """
+    Compare FileLogger throughput against a plain ``open().write`` loop.
+
+    Args:
+        lines (int): Lines written per run.
+    """
+    msg = "Customer Address details missing in Branch DataBase."
+    directory = tempfile.mkdtemp()
+
+    def plain(path):
+        with open(path, "w") as log_file:
+            for _ in range(lines):
+                log_file.write(msg + "\n")
+
+    def logger(path, background=False, **options):
+        file_logger = FileLogger([LogLevel.ALL], path, **options)
+        if background:
+            file_logger.run_in_background(batch_size=4096)
+        for _ in range(lines):
+            file_logger.message(msg, LogLevel.ERROR)
+        file_logger.close()
+
+    runs = (
+        ("open().write", plain),
+        ("text", logger),
+        ("binary", partial(logger, binary=True)),
+        ("text+fsync/100ms", partial(logger, fsync_interval=100)),
+        ("text+rotate", partial(logger, max_bytes=16 << 20)),
+        ("text+background", partial(logger, background=True)),
+    )
+    for name, run in runs:
+        path = os.path.join(directory, name.replace("/", "_") + ".log")
+        start = time.perf_counter()
+        run(path)
+        elapsed = time.perf_counter() - start
+        size = sum(
+            os.path.getsize(os.path.join(directory, entry))
+            for entry in os.listdir(directory)
+            if entry.startswith(os.path.basename(path))
+        )
+        print("{:>16}: {:,.0f} lines/s, {:,.1f} MB/s".format(
+            name, lines / elapsed, size / elapsed / 1e6
+        ))
+
+
+def benchmark_database(rows=100000):
+    """
+    Compare batched DatabaseLogger inserts against one transaction per row.
+
+    Args:
+        rows (int): Rows inserted per run.
+    """
+    msg = "Customer Address details missing in Branch DataBase."
+    directory = tempfile.mkdtemp()
+
+    def per_row(path):
+        connection = sqlite3.connect(path)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(DatabaseLogger.SCHEMA[0])
+        for _ in range(rows):
+            with connection:
+                connection.execute(
+                    DatabaseLogger.INSERT,
+                    (time.time(), LogLevel.ERROR.value, msg)
+                )
+        connection.close()
+
+    def logger(path, background=False):
+        database_logger = DatabaseLogger([LogLevel.ALL], path)
+        if background:
+            database_logger.run_in_background(batch_size=1000)
+        for _ in range(rows):
+            database_logger.message(msg, LogLevel.ERROR)
+        database_logger.close()
+
+    runs = (
+        ("per-row commit", per_row),
+        ("batched", logger),
+        ("batched+background", partial(logger, background=True)),
+    )
+    for name, run in runs:
+        path = os.path.join(directory, name.replace("+", "_") + ".db")
+        start = time.perf_counter()
+        run(path)
+        elapsed = time.perf_counter() - start
+        print("{:>18}: {:,.0f} inserts/s".format(name, rows / elapsed))
+
+
 if __name__ == "__main__":
-    main()
+    if sys.argv[1:] == ["benchmark"]:
+        benchmark()
+    elif sys.argv[1:] == ["benchmark-file"]:
+        benchmark_file()
+    elif sys.argv[1:] == ["benchmark-database"]:
+        benchmark_database()
+    else:
+        main()
@@ -22,38 +22,707 @@
 
 '''
 
+import asyncio
+import inspect
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from array import array
 from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+class CommandLog(object):
+    """Bounded ring buffer of (opcode, receiver id) entries.
+
+    Entries live in two preallocated arrays, so the log takes fixed memory
+    whatever the number of commands executed. Entries before the cursor can
+    be undone, entries after it redone. A receiver stays in the receiver
+    table only while some slot refers to it; its id is reused once the last
+    such slot is overwritten.
+    """
+    def __init__(self, capacity):
+        self._capacity = capacity
+        self._opcodes = array('B', bytes(capacity))
+        self._receiver_ids = array('I', [0]) * capacity
+        self._receivers = []
+        self._receiver_index = {}
+        self._refcounts = []
+        self._free_ids = []
+        self._written = 0
+        self._start = 0
+        self._size = 0
+        self._cursor = 0
+
+    def __len__(self):
+        return self._cursor
+
+    def __iter__(self):
+        """Undoable commands, most recent first."""
+        for position in range(self._cursor - 1, -1, -1):
+            yield self._command(position)
+
+    def __repr__(self):
+        return "CommandLog({!r})".format(list(self))
+
+    def _receiver_id(self, receiver):
+        key = id(receiver)
+        receiver_id = self._receiver_index.get(key)
+        if receiver_id is None:
+            if self._free_ids:
+                receiver_id = self._free_ids.pop()
+                self._receivers[receiver_id] = receiver
+            else:
+                receiver_id = len(self._receivers)
+                self._receivers.append(receiver)
+                self._refcounts.append(0)
+            self._receiver_index[key] = receiver_id
+        self._refcounts[receiver_id] += 1
+        return receiver_id
+
+    def _release(self, receiver_id):
+        self._refcounts[receiver_id] -= 1
+        if not self._refcounts[receiver_id]:
+            receiver = self._receivers[receiver_id]
+            del self._receiver_index[id(receiver)]
+            self._receivers[receiver_id] = None
+            self._free_ids.append(receiver_id)
+
+    def _command(self, position):
+        slot = (self._start + position) % self._capacity
+        return Command.by_opcode[self._opcodes[slot]](
+            self._receivers[self._receiver_ids[slot]]
+        )
+
+    def append(self, command):
+        """Record a command, dropping the redo tail and the oldest entry
+        when full.
+
+        Raises:
+            ValueError: The command has no registered opcode, so it could
+                not be rebuilt from the log.
+        """
+        if command.opcode not in Command.by_opcode:
+            raise ValueError("Cannot log {!r}: it has no opcode.".format(
+                command))
+        if self._cursor == self._capacity:
+            self._start = (self._start + 1) % self._capacity
+            self._cursor -= 1
+        slot = (self._start + self._cursor) % self._capacity
+        receiver_id = self._receiver_id(command._obj)
+        # Slots are first filled in order, so those below _written are live
+        # or hold a dropped entry whose receiver is released here.
+        if slot < self._written:
+            self._release(self._receiver_ids[slot])
+        else:
+            self._written = slot + 1
+        self._opcodes[slot] = command.opcode
+        self._receiver_ids[slot] = receiver_id
+        self._cursor += 1
+        self._size = self._cursor
+
+    def undo(self):
+        """Step back one entry and return its command."""
+        if not self._cursor:
+            raise IndexError("Nothing to undo.")
+        self._cursor -= 1
+        return self._command(self._cursor)
+
+    def redo(self):
+        """Step forward one entry and return its command."""
+        if self._cursor == self._size:
+            raise IndexError("Nothing to redo.")
+        self._cursor += 1
+        return self._command(self._cursor - 1)
+
+    def memory_footprint(self):
+        """Bytes used by the entry arrays and the receiver table."""
+        return (sys.getsizeof(self._opcodes)
+                + sys.getsizeof(self._receiver_ids)
+                + sys.getsizeof(self._receivers)
+                + sys.getsizeof(self._receiver_index)
+                + sys.getsizeof(self._refcounts))
+
+class CommandJournal(object):
+    """Append-only binary write-ahead journal of executed commands.
+
+    The file is a sequence of 8-byte (receiver id, opcode) records, both
+    unsigned 32-bit little-endian; words are byteswapped on big-endian
+    hosts. It may start with a checkpoint: a marker
+    record (CHECKPOINT, n) followed by n records holding the last command of
+    each receiver. Appends are buffered and written with one fsync per
+    group of ``group_size`` records or ``commit_interval`` seconds. The
+    interval is only checked on append: no background timer runs, so a
+    buffered group is durable once the next append, ``commit`` or ``close``
+    writes it.
+
+    Opening an existing journal reads it back, so checkpoints keep the
+    receivers journaled by earlier runs and new ids follow the highest one
+    in the file.
+    """
+    CHECKPOINT = 0xFFFFFFFF
+    RECORD_SIZE = 8
+    # array('I') and memoryview casts use the native byte order.
+    NATIVE = sys.byteorder == "little"
+
+    def __init__(self, path, group_size=1024, commit_interval=0.01):
+        self.path = path
+        self.group_size = group_size
+        self.commit_interval = commit_interval
+        self._ids = {}
+        self._receivers = {}
+        # Receiver id -> opcode of the last command, used for checkpoints.
+        self._state = {}
+        self._stateful = True
+        self._next_id = 0
+        self._buffer = array('I')
+        self._lock = threading.Lock()
+        self._load()
+        self._file = open(path, "ab")
+        self._committed = time.monotonic()
+
+    def _load(self):
+        """Seed the checkpoint state from the records already on disk."""
+        try:
+            journal_file = open(self.path, "r+b")
+        except FileNotFoundError:
+            return
+        with journal_file:
+            data = journal_file.read()
+            size = len(data) - len(data) % self.RECORD_SIZE
+            if size != len(data):
+                # Drop a torn last record so new ones stay aligned.
+                journal_file.truncate(size)
+        words = self._words(data[:size])
+        start = 2 if words and words[0] == self.CHECKPOINT else 0
+        receiver_ids = words[start::2]
+        opcodes = words[start + 1::2]
+        self._state = dict(zip(receiver_ids, opcodes))
+        self._stateful = all(
+            Command.by_opcode[opcode].idempotent for opcode in set(opcodes)
+        )
+        if receiver_ids:
+            self._next_id = max(receiver_ids) + 1
+
+    @classmethod
+    def _words(cls, data):
+        """Array of the unsigned 32-bit words of little-endian ``data``."""
+        words = array('I')
+        words.frombytes(data)
+        if not cls.NATIVE:
+            words.byteswap()
+        return words
+
+    @classmethod
+    def _bytes(cls, words):
+        if not cls.NATIVE:
+            words = array('I', words)
+            words.byteswap()
+        return words.tobytes()
+
+    def register(self, receiver, receiver_id=None):
+        """Give a receiver a stable id, used again to replay the journal.
+
+        Default ids follow the highest id registered or found in the file.
+        """
+        if receiver_id is None:
+            receiver_id = self._next_id
+        if not 0 <= receiver_id < self.CHECKPOINT:
+            raise ValueError("Receiver id out of range: {!r}".format(receiver_id))
+        self._next_id = max(self._next_id, receiver_id + 1)
+        self._ids[id(receiver)] = receiver_id
+        self._receivers[receiver_id] = receiver
+        return receiver_id
+
+    def append(self, command):
+        """Journal a command, committing when the group is full or the
+        commit interval has elapsed.
+
+        Raises:
+            ValueError: The command has no registered opcode, so it could
+                not be replayed.
+        """
+        opcode = command.opcode
+        if opcode not in Command.by_opcode:
+            raise ValueError("Cannot journal {!r}: it has no opcode.".format(
+                command))
+        key = id(command._obj)
+        receiver_id = self._ids.get(key)
+        if receiver_id is None:
+            receiver_id = self.register(command._obj)
+        with self._lock:
+            self._buffer.append(receiver_id)
+            self._buffer.append(opcode)
+            self._state[receiver_id] = opcode
+            if not command.idempotent:
+                self._stateful = False
+            if (len(self._buffer) >= 2 * self.group_size
+                    or time.monotonic() - self._committed
+                    >= self.commit_interval):
+                self._commit()
+
+    def commit(self):
+        """Write and fsync the pending group."""
+        with self._lock:
+            self._commit()
+
+    def _commit(self):
+        if self._buffer:
+            self._file.write(self._bytes(self._buffer))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            del self._buffer[:]
+        self._committed = time.monotonic()
+
+    def checkpoint(self):
+        """Replace the journal by the last command of each receiver.
+
+        Only valid when every journaled command is idempotent, since the
+        receiver state is then set by its last command.
+        """
+        with self._lock:
+            if not self._stateful:
+                raise ValueError("Cannot checkpoint non idempotent commands.")
+            self._commit()
+            records = array('I', [self.CHECKPOINT, len(self._state)])
+            for receiver_id, opcode in self._state.items():
+                records.append(receiver_id)
+                records.append(opcode)
+            temporary = self.path + ".tmp"
+            with open(temporary, "wb") as checkpoint_file:
+                checkpoint_file.write(self._bytes(records))
+                checkpoint_file.flush()
+                os.fsync(checkpoint_file.fileno())
+            self._file.close()
+            os.replace(temporary, self.path)
+            self._file = open(self.path, "ab")
+
+    def close(self):
+        self.commit()
+        self._file.close()
+
+    @classmethod
+    def replay(cls, path, receivers):
+        """Rebuild receiver state from a journal.
+
+        The journal is read through mmap. When every command is idempotent
+        only the last one of each receiver is executed; otherwise commands
+        after the checkpoint run in order. A torn last record is ignored.
+
+        Args:
+            path: Journal path.
+            receivers: Mapping of receiver id to receiver.
+
+        Returns:
+            Tuple of (records read, commands executed).
+        """
+        size = os.path.getsize(path)
+        size -= size % cls.RECORD_SIZE
+        if not size:
+            return 0, 0
+        if not cls.NATIVE:
+            # The mapped words would need byteswapping: read a copy instead.
+            with open(path, "rb") as journal_file:
+                mapped = cls._words(journal_file.read(size))
+        else:
+            with open(path, "rb") as journal_file:
+                mapped = mmap.mmap(
+                    journal_file.fileno(), 0, access=mmap.ACCESS_READ
+                )
+        # Every view exports the mmap buffer and must be released before
+        # the mmap can close, also when a receiver id is missing.
+        views = []
+        try:
+            if cls.NATIVE:
+                words = memoryview(mapped)[:size].cast('I')
+            else:
+                words = memoryview(mapped)
+            views.append(words)
+            start = 0
+            if words[0] == cls.CHECKPOINT:
+                start = 2
+            receiver_ids = words[start::2]
+            views.append(receiver_ids)
+            opcodes = words[start + 1::2]
+            views.append(opcodes)
+            by_opcode = Command.by_opcode
+            if all(by_opcode[opcode].idempotent for opcode in set(opcodes)):
+                commands = dict(zip(receiver_ids, opcodes)).items()
+            else:
+                checkpoint = words[1] if start else 0
+                views.extend((receiver_ids[:checkpoint], opcodes[:checkpoint],
+                              receiver_ids[checkpoint:], opcodes[checkpoint:]))
+                for receiver_id, opcode in zip(views[-4], views[-3]):
+                    by_opcode[opcode](receivers[receiver_id]).execute()
+                commands = zip(views[-2], views[-1])
+            executed = 0
+            for receiver_id, opcode in commands:
+                by_opcode[opcode](receivers[receiver_id]).execute()
+                executed += 1
+            records = len(receiver_ids)
+        finally:
+            for view in views:
+                view.release()
+            if cls.NATIVE:
+                mapped.close()
+        return records, executed
 
 class Switch(object):
     """The INVOKER class"""
-    def __init__(self):
-        self._history = deque()
+    def __init__(self, history_limit=None, journal=None):
+        if history_limit is None:
+            self._history = deque()
+        else:
+            self._history = CommandLog(history_limit)
+        self._redo = []
+        self._journal = journal
 
     @property
     def history(self):
         return self._history
 
     def execute(self, command):
-        self._history.appendleft(command)
-        command.execute()
+        self._record(command)
+        return self._run(command)
+
+    def _record(self, command):
+        if self._journal is not None:
+            self._journal.append(command)
+        if isinstance(self._history, CommandLog):
+            self._history.append(command)
+        else:
+            self._history.appendleft(command)
+            del self._redo[:]
+
+    def _run(self, command):
+        return command.execute()
+
+    def execute_many(self, commands):
+        """Execute a batch of commands, skipping redundant receiver calls.
+
+        Every command is recorded in the history, but the receivers only see
+        the batch left by ``coalesce``. Returns the number of receiver calls
+        saved.
+        """
+        commands = list(commands)
+        for command in commands:
+            self._record(command)
+        reduced = coalesce(commands)
+        for command in reduced:
+            self._run(command)
+        return len(commands) - len(reduced)
+
+    def undo(self):
+        """Revert the last command by executing its inverse."""
+        if isinstance(self._history, CommandLog):
+            command = self._history.undo()
+        else:
+            if not self._history:
+                raise IndexError("Nothing to undo.")
+            command = self._history.popleft()
+            self._redo.append(command)
+        command = command.inverse()
+        if self._journal is not None:
+            self._journal.append(command)
+        return self._run(command)
+
+    def redo(self):
+        """Execute again the last undone command."""
+        if isinstance(self._history, CommandLog):
+            command = self._history.redo()
+        else:
+            if not self._redo:
+                raise IndexError("Nothing to redo.")
+            command = self._redo.pop()
+            self._history.appendleft(command)
+        if self._journal is not None:
+            self._journal.append(command)
+        return self._run(command)
+
+    def memory_footprint(self):
+        """Bytes used to keep the history."""
+        if isinstance(self._history, CommandLog):
+            return self._history.memory_footprint()
+        return sys.getsizeof(self._history) + sum(
+            sys.getsizeof(command) + sys.getsizeof(command.__dict__)
+            for command in self._history
+        )
+
+class ReceiverStats(object):
+    """Queue depth and latency of the commands sent to one receiver"""
+    __slots__ = ("queued", "executed", "total_latency", "max_latency")
+
+    def __init__(self):
+        self.queued = 0
+        self.executed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    @property
+    def mean_latency(self):
+        return self.total_latency / self.executed if self.executed else 0.0
+
+    def done(self, enqueued):
+        latency = time.perf_counter() - enqueued
+        self.queued -= 1
+        self.executed += 1
+        self.total_latency += latency
+        if latency > self.max_latency:
+            self.max_latency = latency
+
+    def __repr__(self):
+        return "ReceiverStats(queued={}, executed={}, mean_latency={:.6f})".format(
+            self.queued, self.executed, self.mean_latency
+        )
+
+class ConcurrentSwitch(Switch):
+    """The INVOKER running commands on a thread pool.
+
+    Commands for the same receiver run one at a time in FIFO order;
+    different receivers run in parallel. ``execute`` returns a Future.
+    Once closed, the switch raises RuntimeError before recording anything.
+    """
+    def __init__(self, max_workers=None, history_limit=None):
+        super(ConcurrentSwitch, self).__init__(history_limit)
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._cond = threading.Condition()
+        # Receiver id -> pending commands, present while a drain task runs.
+        self._queues = {}
+        self._stats = {}
+        self._pending = 0
+        self._closed = False
+
+    def _check_open(self):
+        if self._closed:
+            raise RuntimeError("Switch is closed.")
+
+    def execute(self, command):
+        with self._cond:
+            self._check_open()
+            return super(ConcurrentSwitch, self).execute(command)
+
+    def execute_many(self, commands):
+        with self._cond:
+            self._check_open()
+            return super(ConcurrentSwitch, self).execute_many(commands)
+
+    def undo(self):
+        with self._cond:
+            self._check_open()
+            return super(ConcurrentSwitch, self).undo()
+
+    def redo(self):
+        with self._cond:
+            self._check_open()
+            return super(ConcurrentSwitch, self).redo()
+
+    def _run(self, command):
+        # Called with self._cond held.
+        receiver = command._obj
+        key = id(receiver)
+        future = Future()
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = (receiver, ReceiverStats())
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = deque()
+            # Submit before any bookkeeping, so a failure leaves none behind.
+            self._executor.submit(self._drain, key, queue, stats[1])
+            self._queues[key] = queue
+        stats[1].queued += 1
+        self._pending += 1
+        queue.append((command, future, time.perf_counter()))
+        return future
+
+    def _drain(self, key, queue, stats):
+        while True:
+            with self._cond:
+                if not queue:
+                    del self._queues[key]
+                    return
+                command, future, enqueued = queue.popleft()
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(command.execute())
+                except Exception as error:
+                    future.set_exception(error)
+            with self._cond:
+                stats.done(enqueued)
+                self._pending -= 1
+                if not self._pending:
+                    self._cond.notify_all()
+
+    def stats(self):
+        """Pairs of (receiver, ReceiverStats)."""
+        with self._cond:
+            return list(self._stats.values())
+
+    def drain(self, timeout=None):
+        """Block until every command submitted so far has run."""
+        with self._cond:
+            return self._cond.wait_for(lambda: not self._pending, timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+        self.drain()
+        self._executor.shutdown()
+
+class AsyncSwitch(Switch):
+    """The INVOKER running commands as asyncio tasks.
+
+    Receiver methods may be coroutines. Commands for the same receiver run
+    in FIFO order; different receivers run concurrently. ``execute`` must be
+    called from a running event loop and returns an asyncio Future.
+    """
+    def __init__(self, history_limit=None):
+        super(AsyncSwitch, self).__init__(history_limit)
+        self._queues = {}
+        self._stats = {}
+        # The event loop only keeps weak references to running tasks.
+        self._tasks = set()
+        self._pending = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def _run(self, command):
+        receiver = command._obj
+        key = id(receiver)
+        future = asyncio.get_running_loop().create_future()
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = (receiver, ReceiverStats())
+        stats[1].queued += 1
+        self._pending += 1
+        self._idle.clear()
+        queue = self._queues.get(key)
+        if queue is None:
+            queue = self._queues[key] = deque()
+            task = asyncio.ensure_future(self._drain(key, queue, stats[1]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        queue.append((command, future, time.perf_counter()))
+        return future
+
+    async def _drain(self, key, queue, stats):
+        entry = None
+        try:
+            while queue:
+                entry = queue.popleft()
+                command, future, enqueued = entry
+                try:
+                    result = command.execute()
+                    if inspect.isawaitable(result):
+                        result = await result
+                except Exception as error:
+                    if not future.cancelled():
+                        future.set_exception(error)
+                else:
+                    if not future.cancelled():
+                        future.set_result(result)
+                stats.done(enqueued)
+                self._pending -= 1
+                entry = None
+        finally:
+            # If the task was cancelled, cancel the commands it did not run.
+            if entry is not None:
+                queue.appendleft(entry)
+            for _, future, _ in queue:
+                future.cancel()
+                self._pending -= 1
+            queue.clear()
+            del self._queues[key]
+            if not self._pending:
+                self._idle.set()
+
+    def stats(self):
+        """Pairs of (receiver, ReceiverStats)."""
+        return list(self._stats.values())
+
+    async def drain(self):
+        """Wait until every command submitted so far has run."""
+        await self._idle.wait()
+
+def coalesce(commands):
+    """Peephole pass over a batch of commands.
+
+    Per receiver, a command repeating the previous idempotent one is
+    dropped, and a command undoing the previous one cancels it. For
+    idempotent commands, which set the receiver state, a pair only cancels
+    when the state it returns to was itself set earlier in the batch.
+    Commands on different receivers keep their relative order.
+    """
+    kept = []
+    stacks = {}
+    for command in commands:
+        stack = stacks.setdefault(id(command._obj), [])
+        if stack:
+            top = kept[stack[-1]]
+            if command.idempotent and type(command) is type(top):
+                continue
+            if type(top) is command.inverse_class:
+                if not command.idempotent:
+                    kept[stack.pop()] = None
+                    continue
+                if len(stack) > 1 and type(kept[stack[-2]]) is type(command):
+                    kept[stack.pop()] = None
+                    continue
+        stack.append(len(kept))
+        kept.append(command)
+    return [command for command in kept if command is not None]
 
 class Command(object):
     """The COMMAND interface"""
+    # Opcode -> command class, filled by subclasses declaring an opcode.
+    by_opcode = {}
+    opcode = None
+    inverse_class = None
+    # Whether executing the command twice in a row has the effect of once.
+    idempotent = False
+
     def __init__(self, obj):
         self._obj = obj
 
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.opcode is not None:
+            Command.by_opcode[cls.opcode] = cls
+
+    def __repr__(self):
+        return "{}({!r})".format(type(self).__name__, self._obj)
+
     def execute(self):
         raise NotImplementedError
 
+    def inverse(self):
+        """The COMMAND undoing this one"""
+        if self.inverse_class is None:
+            raise NotImplementedError
+        return self.inverse_class(self._obj)
+
 class TurnOnCommand(Command):
     """The COMMAND for turning on the light"""
+    opcode = 1
+    idempotent = True
+
     def execute(self):
-        self._obj.turn_on()
+        return self._obj.turn_on()
 
 class TurnOffCommand(Command):
     """The COMMAND for turning off the light"""
+    opcode = 2
+    inverse_class = TurnOnCommand
+    idempotent = True
+
     def execute(self):
-        self._obj.turn_off()
+        return self._obj.turn_off()
+
+TurnOnCommand.inverse_class = TurnOffCommand
 
 class Light(object):
     """The RECEIVER class"""
@@ -63,11 +732,35 @@ class Light(object):
     def turn_off(self):
         print("The light is off")
 
+class IngestStats(object):
+    """Outcome of a LightSwitchClient.ingest call"""
+    __slots__ = ("commands", "errors", "first_error", "saved", "elapsed")
+
+    def __init__(self):
+        self.commands = 0
+        self.errors = 0
+        self.first_error = None
+        self.saved = 0
+        self.elapsed = 0.0
+
+    @property
+    def rate(self):
+        return self.commands / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return ("IngestStats(commands={}, errors={}, first_error={}, "
+                "saved={}, rate={:.0f}/s)").format(
+                    self.commands, self.errors, self.first_error,
+                    self.saved, self.rate)
+
 class LightSwitchClient(object):
     """The CLIENT class"""
-    def __init__(self):
-        self._lamp = Light()
-        self._switch = Switch()
+    def __init__(self, lamp=None, switch=None):
+        self._lamp = Light() if lamp is None else lamp
+        self._switch = Switch() if switch is None else switch
+        # Interned token -> shared COMMAND, commands hold no per-call state.
+        on, off = TurnOnCommand(self._lamp), TurnOffCommand(self._lamp)
+        self._commands = {b"ON": on, b"OFF": off, b"on": on, b"off": off}
 
     @property
     def switch(self):
@@ -82,8 +775,53 @@ class LightSwitchClient(object):
         else:
             print("Argument 'ON' or 'OFF' is required.")
 
+    def ingest(self, source, chunk_size=1 << 20):
+        """Execute newline-delimited commands read from a stream.
 
-if __name__ == "__main__":
+        ``source`` is a path, a binary file or pipe, or a connected socket.
+        Input is read in chunks, tokens are mapped to shared commands through
+        a lookup table and each chunk is sent to ``Switch.execute_many``.
+        Invalid lines are counted instead of printed; blank lines are skipped.
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as stream:
+                return self.ingest(stream, chunk_size)
+        read = source.read if hasattr(source, "read") else source.recv
+        lookup = self._commands.get
+        stats = IngestStats()
+        start = time.perf_counter()
+        line = 0
+        tail = b""
+        while True:
+            chunk = read(chunk_size)
+            if not chunk:
+                lines = [tail] if tail else []
+            else:
+                lines = (tail + chunk).split(b"\n")
+                tail = lines.pop()
+            batch = list(map(lookup, lines))
+            if None in batch:
+                for index, command in enumerate(batch):
+                    if command is None:
+                        token = lines[index].strip()
+                        command = lookup(token.upper())
+                        if command is None and token:
+                            stats.errors += 1
+                            if stats.first_error is None:
+                                stats.first_error = line + index + 1
+                        batch[index] = command
+                batch = [command for command in batch if command is not None]
+            line += len(lines)
+            if batch:
+                stats.commands += len(batch)
+                stats.saved += self._switch.execute_many(batch)
+            if not chunk:
+                break
+        stats.elapsed = time.perf_counter() - start
+        return stats
+
+
+def main():
     light_switch = LightSwitchClient()
     print("Switch ON test.")
     light_switch.press("ON")
@@ -94,3 +832,198 @@ if __name__ == "__main__":
 
     print("Command history:")
     print(light_switch.switch.history)
+
+    print("Bounded history undo/redo test.")
+    lamp = Light()
+    switch = Switch(history_limit=1000)
+    switch.execute(TurnOnCommand(lamp))
+    switch.undo()
+    switch.redo()
+    print("History of {} commands in {} bytes".format(
+        len(switch.history), switch.memory_footprint()
+    ))
+
+    print("Batch execution test.")
+    saved = switch.execute_many([
+        TurnOnCommand(lamp), TurnOffCommand(lamp),
+        TurnOnCommand(lamp), TurnOnCommand(lamp),
+    ])
+    print("Saved {} receiver calls".format(saved))
+
+    print("Concurrent execution test.")
+    switch = ConcurrentSwitch(max_workers=4)
+    lamps = [Light(), Light()]
+    for lamp in lamps:
+        switch.execute(TurnOnCommand(lamp))
+        switch.execute(TurnOffCommand(lamp))
+    switch.drain()
+    for lamp, stats in switch.stats():
+        print(stats)
+    switch.close()
+
+    print("Journal replay test.")
+    path = os.path.join(tempfile.mkdtemp(), "commands.journal")
+    journal = CommandJournal(path)
+    lamp = Light()
+    journal.register(lamp, 0)
+    switch = Switch(journal=journal)
+    switch.execute(TurnOnCommand(lamp))
+    switch.execute(TurnOffCommand(lamp))
+    journal.close()
+    print("Replayed {} records with {} commands".format(
+        *CommandJournal.replay(path, {0: Light()})
+    ))
+
+class NullLight(object):
+    """RECEIVER doing nothing, used to measure invoker overhead"""
+    def __init__(self):
+        self.on = False
+
+    def turn_on(self):
+        self.on = True
+
+    def turn_off(self):
+        self.on = False
+
+def benchmark_journal(commands=2000000, receivers=1000):
+    """Journal commands through a Switch, checkpoint, then replay them."""
+    path = os.path.join(tempfile.mkdtemp(), "commands.journal")
+    journal = CommandJournal(path, group_size=65536)
+    lamps = [NullLight() for _ in range(receivers)]
+    for receiver_id, lamp in enumerate(lamps):
+        journal.register(lamp, receiver_id)
+    switch = Switch(history_limit=1024, journal=journal)
+    kinds = (TurnOnCommand, TurnOffCommand)
+    start = time.perf_counter()
+    for index in range(commands):
+        switch.execute(kinds[index % 3 % 2](lamps[index % receivers]))
+    journal.close()
+    elapsed = time.perf_counter() - start
+    print("journal: {:,.0f} commands/s, {:,} bytes".format(
+        commands / elapsed, os.path.getsize(path)
+    ))
+
+    replayed = {receiver_id: NullLight() for receiver_id in range(receivers)}
+    start = time.perf_counter()
+    records, executed = CommandJournal.replay(path, replayed)
+    elapsed = time.perf_counter() - start
+    print("replay: {:,} records, {:,} executed in {:.3f}s".format(
+        records, executed, elapsed
+    ))
+    assert all(replayed[i].on == lamp.on for i, lamp in enumerate(lamps))
+
+def benchmark_ingest(commands=5000000):
+    """Stream a command file through LightSwitchClient.ingest."""
+    path = os.path.join(tempfile.mkdtemp(), "commands.txt")
+    with open(path, "wb") as command_file:
+        command_file.write(b"ON\nOFF\non\n OFF \n" * (commands // 4))
+    client = LightSwitchClient(NullLight(), Switch(history_limit=1024))
+    stats = client.ingest(path)
+    print("ingest: {:,} commands, {:,.0f} commands/s, {:.1f} MB/s".format(
+        stats.commands, stats.rate, os.path.getsize(path) / stats.elapsed / 1e6
+    ))
+
+
+class CommandLogTestCase(unittest.TestCase):
+    def test_command_without_opcode_leaves_log_unchanged(self):
+        class Noop(Command):
+            def execute(self):
+                pass
+
+        log = CommandLog(2)
+        first, second = NullLight(), NullLight()
+        log.append(TurnOnCommand(first))
+        log.append(TurnOnCommand(second))
+        with self.assertRaises(ValueError):
+            log.append(Noop(NullLight()))
+        self.assertEqual(len(log._receivers), 2)
+        log.append(TurnOffCommand(second))
+        self.assertEqual([type(command) for command in log],
+                         [TurnOffCommand, TurnOnCommand])
+        self.assertNotIn(id(first), log._receiver_index)
+
+    def test_receiver_ids_are_four_bytes(self):
+        self.assertEqual(CommandLog(1)._receiver_ids.itemsize, 4)
+
+
+class CommandJournalTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "journal")
+
+    def replay(self, count):
+        lights = [NullLight() for _ in range(count)]
+        CommandJournal.replay(self.path, dict(enumerate(lights)))
+        return [light.on for light in lights]
+
+    def test_round_trip(self):
+        journal = CommandJournal(self.path)
+        first, second = NullLight(), NullLight()
+        switch = Switch(journal=journal)
+        switch.execute(TurnOnCommand(first))
+        switch.execute(TurnOnCommand(second))
+        switch.execute(TurnOffCommand(first))
+        journal.close()
+        self.assertEqual(self.replay(2), [False, True])
+
+    def test_reopen_and_checkpoint(self):
+        journal = CommandJournal(self.path)
+        journal.append(TurnOnCommand(NullLight()))
+        journal.append(TurnOnCommand(NullLight()))
+        journal.close()
+        journal = CommandJournal(self.path)
+        third = NullLight()
+        self.assertEqual(journal.register(third), 2)
+        journal.append(TurnOnCommand(third))
+        journal.checkpoint()
+        journal.close()
+        self.assertEqual(os.path.getsize(self.path),
+                         4 * CommandJournal.RECORD_SIZE)
+        self.assertEqual(self.replay(3), [True, True, True])
+
+    def test_command_without_opcode_is_rejected(self):
+        class Noop(Command):
+            def execute(self):
+                pass
+
+        journal = CommandJournal(self.path)
+        light = NullLight()
+        switch = Switch(journal=journal)
+        switch.execute(TurnOnCommand(light))
+        with self.assertRaises(ValueError):
+            switch.execute(Noop(light))
+        switch.execute(TurnOffCommand(light))
+        switch.execute(TurnOnCommand(light))
+        journal.close()
+        self.assertEqual(CommandJournal.replay(self.path, {0: NullLight()}),
+                         (3, 1))
+
+    def test_torn_record_is_dropped_on_open(self):
+        journal = CommandJournal(self.path)
+        journal.append(TurnOnCommand(NullLight()))
+        journal.close()
+        with open(self.path, "ab") as journal_file:
+            journal_file.write(b"\x01\x02")
+        journal = CommandJournal(self.path)
+        journal.append(TurnOffCommand(NullLight()))
+        journal.close()
+        self.assertEqual(self.replay(2), [True, False])
+
+    def test_records_are_little_endian(self):
+        journal = CommandJournal(self.path)
+        journal.register(NullLight(), 258)
+        journal.append(TurnOnCommand(journal._receivers[258]))
+        journal.close()
+        with open(self.path, "rb") as journal_file:
+            self.assertEqual(journal_file.read(),
+                             struct.pack("<II", 258, TurnOnCommand.opcode))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["test"]:
+        unittest.main(argv=sys.argv[:1] + sys.argv[2:])
+    elif sys.argv[1:] == ["benchmark-journal"]:
+        benchmark_journal()
+    elif sys.argv[1:] == ["benchmark-ingest"]:
+        benchmark_ingest()
+    else:
+        main()
@@ -13,20 +13,96 @@
 
 '''
 
+import importlib
+import os
+import sys
+import time
+import timeit
 from abc import ABCMeta, abstractmethod
+from functools import wraps
+
+
+def load(path):
+    """
+    Import the object named by ``"package.module:attribute"``.
+    """
+    module, _, attribute = path.partition(":")
+    return getattr(importlib.import_module(module), attribute)
+
+
+def memoized(method):
+    """
+    Cache the result of an argument-less method of an immutable object.
+    """
+    name = "_memo_" + method.__name__
+
+    @wraps(method)
+    def wrapper(self):
+        try:
+            return self.__dict__[name]
+        except KeyError:
+            value = self.__dict__[name] = method(self)
+            return value
+    return wrapper
+
+
+def current_platform():
+    if sys.platform.startswith("linux"):
+        return "linux"
+    if sys.platform == "darwin":
+        return "macos"
+    if sys.platform in ("win32", "cygwin"):
+        return "windows"
+    return sys.platform
 
 
 class GUIFactory:
     __metaclass__ = ABCMeta
 
+    # Platform -> dotted path of its concrete factory, imported on first use.
+    # The bundled families are top-level modules next to this one, importing
+    # it as ``abstract_factory``: creational/ must be on sys.path, as it is
+    # when running these scripts from that directory.
+    registry = {}
+    # Platform -> resolved factory instance.
+    _factories = {}
+
+    @classmethod
+    def register(cls, platform, path):
+        GUIFactory.registry[platform] = path
+        GUIFactory._factories.pop(platform, None)
+
+    @classmethod
+    def for_platform(cls, platform=None):
+        """
+        Concrete factory of a platform, the running one by default. It is
+        loaded and instantiated once, then shared.
+        """
+        if platform is None:
+            platform = current_platform()
+        factory = GUIFactory._factories.get(platform)
+        if factory is None:
+            factory = load(GUIFactory.registry[platform])()
+            GUIFactory._factories[platform] = factory
+        return factory
+
+    def __init__(self):
+        self._products = {}
+
+    def shared(self, product_class):
+        """
+        Instance of an immutable product class, created once per factory.
+        """
+        try:
+            return self._products[product_class]
+        except KeyError:
+            product = self._products[product_class] = product_class()
+            return product
+
     @abstractmethod
     def create_button(self):
         raise NotImplementedError("To be implemented")
 
-class LinuxFactory(GUIFactory):
-    def create_button(self):
-        return LinuxButton()
-
 
 class Button:
     __metaclass__ = ABCMeta
@@ -35,22 +111,81 @@ class Button:
     def paint(self):
         pass
 
-class LinuxButton(Button):
-    def paint(self):
-        return "Render a button in a Linux style"
-
-class WindowsButton(Button):
-    def paint(self):
-        return "Render a button in a Windows style"
-
-
-class MacOSButton(Button):
-    def paint(self):
-        return "Render a button in a MacOS style"
 
+# Each product family lives in its own module, imported on first use.
+GUIFactory.register("linux", "abstract_factory_linux:LinuxFactory")
+GUIFactory.register("windows", "abstract_factory_windows:WindowsFactory")
+GUIFactory.register("macos", "abstract_factory_macos:MacOSFactory")
+
+
+def __getattr__(name):
+    """
+    Resolve the factories and buttons of registered families lazily, so
+    ``from abstract_factory import LinuxFactory`` keeps working.
+    """
+    for path in GUIFactory.registry.values():
+        module, _, factory = path.partition(":")
+        button = factory[:-len("Factory")] + "Button"
+        if name in (factory, button):
+            return load(module + ":" + name)
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, name)
+    )
+
+
+def import_time(statement):
+    """
+    Seconds taken by an import statement in a fresh interpreter.
+    """
+    # Imported here so that importing this module stays cheap.
+    import subprocess
+    code = (
+        "import time\n"
+        "start = time.perf_counter()\n"
+        + statement +
+        "\nprint(time.perf_counter() - start)"
+    )
+    output = subprocess.check_output(
+        [sys.executable, "-c", code], cwd=os.path.dirname(os.path.abspath(__file__))
+    )
+    return float(output)
+
+
+def benchmark(number=1000000):
+    print("first import: {:.0f}us lazy, {:.0f}us with every family".format(
+        import_time("import abstract_factory") * 1e6,
+        import_time(
+            "import abstract_factory, abstract_factory_linux, "
+            "abstract_factory_windows, abstract_factory_macos"
+        ) * 1e6,
+    ))
+    start = time.perf_counter()
+    factory = GUIFactory.for_platform("linux")
+    print("first for_platform: {:.1f}us".format(
+        (time.perf_counter() - start) * 1e6
+    ))
+    print("cached for_platform: {:.0f}ns".format(
+        timeit.timeit(lambda: GUIFactory.for_platform("linux"), number=number)
+        / number * 1e9
+    ))
+    button_class = type(factory.create_button())
+    paint = button_class.paint.__wrapped__
+    fresh = timeit.timeit(lambda: paint(button_class()), number=number)
+    shared = timeit.timeit(
+        lambda: factory.create_button().paint(), number=number
+    )
+    print("create_button().paint(): {:.0f}ns fresh, {:.0f}ns shared".format(
+        fresh / number * 1e9, shared / number * 1e9
+    ))
 
 
 if __name__ == '__main__':
-    factory = LinuxFactory()
-    button = factory.create_button()
-    print(button.paint())
+    # The product family modules import this module by name; let them get
+    # this copy rather than a second one with its own registry.
+    sys.modules.setdefault("abstract_factory", sys.modules[__name__])
+    if sys.argv[1:] == ["benchmark"]:
+        benchmark()
+    else:
+        factory = GUIFactory.for_platform("linux")
+        button = factory.create_button()
+        print(button.paint())
@@ -0,0 +1,17 @@
+'''
+    Linux product family of the abstract factory example, imported by
+    GUIFactory.for_platform("linux") on first use.
+'''
+
+from abstract_factory import Button, GUIFactory, memoized
+
+
+class LinuxFactory(GUIFactory):
+    def create_button(self):
+        return self.shared(LinuxButton)
+
+
+class LinuxButton(Button):
+    @memoized
+    def paint(self):
+        return "Render a button in a Linux style"
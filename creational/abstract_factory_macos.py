@@ -0,0 +1,17 @@
+'''
+    MacOS product family of the abstract factory example, imported by
+    GUIFactory.for_platform("macos") on first use.
+'''
+
+from abstract_factory import Button, GUIFactory, memoized
+
+
+class MacOSFactory(GUIFactory):
+    def create_button(self):
+        return self.shared(MacOSButton)
+
+
+class MacOSButton(Button):
+    @memoized
+    def paint(self):
+        return "Render a button in a MacOS style"
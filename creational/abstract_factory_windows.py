@@ -0,0 +1,17 @@
+'''
+    Windows product family of the abstract factory example, imported by
+    GUIFactory.for_platform("windows") on first use.
+'''
+
+from abstract_factory import Button, GUIFactory, memoized
+
+
+class WindowsFactory(GUIFactory):
+    def create_button(self):
+        return self.shared(WindowsButton)
+
+
+class WindowsButton(Button):
+    @memoized
+    def paint(self):
+        return "Render a button in a Windows style"
@@ -16,21 +16,81 @@
 '''
 
 from __future__ import print_function
+import gc
+import sys
+import time
+import tracemalloc
+import weakref
 from abc import ABCMeta, abstractmethod
+from array import array
+from collections import Counter
 
 
 class Car(object):
+    __slots__ = ("wheels", "seats", "color")
+
     def __init__(self, wheels=4, seats=4, color="Black"):
         self.wheels = wheels
         self.seats = seats
         self.color = color
 
+    def reset(self):
+        """Restore the default configuration before reuse from a pool."""
+        self.wheels = 4
+        self.seats = 4
+        self.color = "Black"
+
     def __str__(self):
         return "This is a {0} car with {1} wheels and {2} seats.".format(
             self.color, self.wheels, self.seats
         )
 
 
+class FrozenCar(Car):
+    """Immutable, interned car: equal configurations share one instance,
+    so equality and hashing are identity checks."""
+    __slots__ = ("__weakref__",)
+
+    def __init__(self, wheels=4, seats=4, color="Black"):
+        object.__setattr__(self, "wheels", wheels)
+        object.__setattr__(self, "seats", seats)
+        object.__setattr__(self, "color", color)
+
+    def __setattr__(self, name, value):
+        raise RuntimeError('This object is immutable')
+
+    def __delattr__(self, name):
+        raise RuntimeError('This object is immutable')
+
+    def reset(self):
+        raise RuntimeError('This object is immutable')
+
+
+class CarInterner(object):
+    """Intern table of FrozenCar by configuration.
+
+    Values are held weakly: a configuration nobody uses any more drops out
+    of the table.
+    """
+    def __init__(self):
+        self._cars = weakref.WeakValueDictionary()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._cars)
+
+    def intern(self, wheels, seats, color):
+        key = (wheels, seats, color)
+        car = self._cars.get(key)
+        if car is None:
+            self.misses += 1
+            car = self._cars[key] = FrozenCar(wheels, seats, color)
+        else:
+            self.hits += 1
+        return car
+
+
 class Builder:
     __metaclass__ = ABCMeta
 
@@ -51,9 +111,48 @@ class Builder:
         pass
 
 
+class CarPool(object):
+    """Free list of cars reused by builders instead of allocating new ones.
+
+    Builders acquire a car from the pool, callers release it when done with
+    it. Released cars are reset; at most ``size`` of them are kept, and the
+    rest are dropped and forgotten. Releasing an interned FrozenCar, or a
+    car the pool still keeps, raises ValueError; releasing a dropped car
+    again goes unnoticed, as tracking it would take a weak reference slot
+    in every Car.
+    """
+    def __init__(self, size=1024, factory=Car):
+        self.size = size
+        self.factory = factory
+        self.hits = 0
+        self.misses = 0
+        # A set, so that membership catches a kept car released twice.
+        self._free = set()
+
+    def acquire(self):
+        if self._free:
+            self.hits += 1
+            return self._free.pop()
+        self.misses += 1
+        return self.factory()
+
+    def release(self, car):
+        if isinstance(car, FrozenCar):
+            raise ValueError("Interned cars cannot be released to a pool.")
+        if car in self._free:
+            raise ValueError("Car is already released.")
+        if len(self._free) < self.size:
+            car.reset()
+            self._free.add(car)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "free": len(self._free)}
+
+
 class CarBuilder(Builder):
-    def __init__(self):
-        self.car = Car()
+    def __init__(self, pool=None, interner=None):
+        self.car = Car() if pool is None else pool.acquire()
+        self.interner = interner
 
     def set_wheels(self, value):
         self.car.wheels = value
@@ -65,19 +164,227 @@ class CarBuilder(Builder):
         self.car.color = value
 
     def get_result(self):
+        if self.interner is not None:
+            car = self.car
+            return self.interner.intern(car.wheels, car.seats, car.color)
         return self.car
 
 
+class CarView(object):
+    """Read-only view of one car of a CarBatch."""
+    __slots__ = ("_batch", "_index")
+
+    def __init__(self, batch, index):
+        self._batch = batch
+        self._index = index
+
+    @property
+    def wheels(self):
+        return self._batch.wheels[self._index]
+
+    @property
+    def seats(self):
+        return self._batch.seats[self._index]
+
+    @property
+    def color(self):
+        return self._batch.colors[self._batch.color_codes[self._index]]
+
+    __str__ = Car.__str__
+
+
+class CarBatch(object):
+    """Cars stored as columns: typed arrays for wheels and seats and a
+    categorical color column (codes into ``colors``).
+
+    Aggregations run over the columns; indexing returns a CarView.
+    """
+    def __init__(self, wheels, seats, color_codes, colors):
+        self.wheels = wheels
+        self.seats = seats
+        self.color_codes = color_codes
+        self.colors = colors
+
+    def __len__(self):
+        return len(self.wheels)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("CarBatch index out of range")
+        return CarView(self, index)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield CarView(self, index)
+
+    def total_wheels(self):
+        return sum(self.wheels)
+
+    def total_seats(self):
+        return sum(self.seats)
+
+    def color_counts(self):
+        # One pass over the codes, whatever the number of colors.
+        counts = Counter(self.color_codes)
+        return {color: counts[code] for code, color in enumerate(self.colors)}
+
+
+def _numeric_column(values):
+    """64-bit integer array, or a float array when a value is not an int or
+    does not fit."""
+    try:
+        return array('q', values)
+    except (TypeError, OverflowError):
+        return array('d', values)
+
+
 class CarBuilderDirector(object):
     @staticmethod
-    def construct():
-        builder = CarBuilder()
+    def construct(builder=None):
+        if builder is None:
+            builder = CarBuilder()
         builder.set_wheels(8)
         builder.set_seats(4)
         builder.set_color("Red")
         return builder.get_result()
 
+    @staticmethod
+    def construct_many(n, spec):
+        """
+        Build ``n`` cars at once as a CarBatch.
+
+        ``spec`` maps "wheels", "seats" and "color" to either one value for
+        every car or a sequence of ``n`` values; missing keys take the Car
+        defaults.
+        """
+        default = Car()
+        columns = {}
+        for name in Car.__slots__:
+            value = spec.get(name, getattr(default, name))
+            # Strings and anything without a length are one value.
+            if isinstance(value, str) or not hasattr(value, "__len__"):
+                value = [value] * n
+            elif len(value) != n:
+                raise ValueError("Expected {} values for {}".format(n, name))
+            columns[name] = value
+
+        colors = []
+        index = {}
+        codes = array('I')
+        for color in columns["color"]:
+            code = index.get(color)
+            if code is None:
+                code = index[color] = len(colors)
+                colors.append(color)
+            codes.append(code)
+        return CarBatch(
+            _numeric_column(columns["wheels"]),
+            _numeric_column(columns["seats"]),
+            codes, colors
+        )
+
+
+class PooledCarBuilderDirector(object):
+    """Director reusing one builder and taking cars from a pool."""
+    def __init__(self, pool):
+        self.pool = pool
+        # Created by the first construct, which uses the car it acquires.
+        self.builder = None
+
+    def construct(self):
+        builder = self.builder
+        if builder is None:
+            builder = self.builder = CarBuilder(self.pool)
+        else:
+            builder.car = self.pool.acquire()
+        return CarBuilderDirector.construct(builder)
+
+
+class DictCar(object):
+    """Dict-backed car, the layout Car had before __slots__."""
+    def __init__(self, wheels=4, seats=4, color="Black"):
+        self.wheels = wheels
+        self.seats = seats
+        self.color = color
+
+
+def benchmark(count=1000000):
+    """Compare building throwaway cars with and without a pool."""
+    def dict_path():
+        # A pool keeping no free cars allocates a DictCar for every build.
+        dict_pool = CarPool(size=0, factory=DictCar)
+        for _ in range(count):
+            CarBuilderDirector.construct(CarBuilder(dict_pool))
+
+    def fresh_path():
+        for _ in range(count):
+            CarBuilderDirector.construct()
+
+    def pooled_path(pool):
+        director = PooledCarBuilderDirector(pool)
+        for _ in range(count):
+            pool.release(director.construct())
+
+    pool = CarPool()
+    print("Car size: {} bytes with __slots__, {} bytes with a dict".format(
+        sys.getsizeof(Car()),
+        sys.getsizeof(DictCar()) + sys.getsizeof(DictCar().__dict__)
+    ))
+    for name, run in (("dict", dict_path), ("slots", fresh_path),
+                      ("slots+pool", lambda: pooled_path(pool))):
+        collections = sum(stat["collections"] for stat in gc.get_stats())
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        collections = sum(
+            stat["collections"] for stat in gc.get_stats()
+        ) - collections
+        print("{:>10}: {:,.0f} cars/s, {} GC collections".format(
+            name, count / elapsed, collections
+        ))
+    print("Pool: {}".format(pool.stats()))
+
+    colors = ["Red", "Black", "White", "Blue"] * (count // 4)
+    seats = [2, 4, 5, 7] * (count // 4)
+    start = time.perf_counter()
+    cars = [Car(8, seat, color) for seat, color in zip(seats, colors)]
+    counts = {}
+    for car in cars:
+        counts[car.color] = counts.get(car.color, 0) + 1
+    total = sum(car.seats for car in cars)
+    objects = time.perf_counter() - start
+    start = time.perf_counter()
+    batch = CarBuilderDirector.construct_many(
+        len(colors), {"wheels": 8, "seats": seats, "color": colors}
+    )
+    assert batch.color_counts() == counts and batch.total_seats() == total
+    columnar = time.perf_counter() - start
+    print("Build and aggregate: {:.3f}s with objects, {:.3f}s columnar".format(
+        objects, columnar
+    ))
+
+    interner = CarInterner()
+    for name, make_builder in (("mutable", CarBuilder),
+                               ("interned", lambda: CarBuilder(interner=interner))):
+        tracemalloc.start()
+        fleet = []
+        for index in range(count // 10):
+            builder = make_builder()
+            builder.set_seats(seats[index])
+            builder.set_color(colors[index])
+            fleet.append(builder.get_result())
+        used, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("{:>8} fleet of {:,}: {:,} bytes, {} distinct cars".format(
+            name, len(fleet), used, len(set(map(id, fleet)))
+        ))
+
 
 if __name__ == '__main__':
-    car = CarBuilderDirector.construct()
-    print(car)
+    if sys.argv[1:] == ["benchmark"]:
+        benchmark()
+    else:
+        car = CarBuilderDirector.construct()
+        print(car)
@@ -13,7 +13,222 @@
 
 '''
 
+import random
+import sys
+import time
+import tracemalloc
 from abc import ABC, abstractmethod
+from array import array
+from collections import deque
+
+
+class CompactMaze(object):
+    """
+    Maze keeping rooms as integer ids instead of objects.
+
+    ``room_types[i]`` indexes ``kinds``, the room classes made by the game's
+    factory method. Connections are in CSR form: the rooms connected to
+    room ``i`` are ``neighbors[offsets[i]:offsets[i + 1]]``.
+    """
+
+    def __init__(self, kinds, room_types, offsets, neighbors):
+        self.kinds = kinds
+        self.room_types = room_types
+        self.offsets = offsets
+        self.neighbors = neighbors
+
+    def __len__(self):
+        return len(self.room_types)
+
+    def connected_rooms(self, room_id):
+        return self.neighbors[self.offsets[room_id]:self.offsets[room_id + 1]]
+
+    def room(self, room_id):
+        """
+        Materialize a room object; its connections stay in the maze.
+        """
+        return self.kinds[self.room_types[room_id]]()
+
+    def memory_footprint(self):
+        return sum(
+            sys.getsizeof(column)
+            for column in (self.room_types, self.offsets, self.neighbors)
+        )
+
+    def memory_per_room(self):
+        return self.memory_footprint() / len(self)
+
+    def to_rooms(self):
+        """
+        Materialize the maze as connected room objects.
+        """
+        rooms = [self.room(room_id) for room_id in range(len(self))]
+        for room_id, room in enumerate(rooms):
+            room.connected_rooms = [
+                rooms[other] for other in self.connected_rooms(room_id)
+            ]
+        return rooms
+
+
+class MazeQuery(object):
+    """
+    Path and connectivity queries over the room objects of a MazeGame.
+
+    Paths, reachability and neighborhoods follow connections in the
+    direction they were made. Components ignore direction and are kept in a
+    union-find structure updated by every ``Room.connect``, so component
+    queries never rescan the maze. Component queries about rooms the engine
+    does not track answer False or None.
+    """
+
+    def __init__(self, game):
+        self.game = game
+        self._index = {}
+        self._parent = []
+        self._size = []
+        self.component_count = 0
+        for room in game.rooms:
+            self.add_room(room)
+
+    def add_room(self, room):
+        """
+        Track a room added to the game after the engine was created, along
+        with every room it already leads to.
+        """
+        if room in self._index:
+            return
+        self._track(room)
+        stack = [room]
+        while stack:
+            current = stack.pop()
+            for other in current.connected_rooms:
+                if other not in self._index:
+                    self._track(other)
+                    stack.append(other)
+                self._union(self._index[current], self._index[other])
+
+    def _track(self, room):
+        self._index[room] = len(self._parent)
+        self._parent.append(len(self._parent))
+        self._size.append(1)
+        self.component_count += 1
+        if room.queries:
+            room.queries.append(self)
+        else:
+            room.queries = [self]
+
+    def _find(self, node):
+        parent = self._parent
+        root = node
+        while parent[root] != root:
+            root = parent[root]
+        while parent[node] != root:
+            parent[node], node = root, parent[node]
+        return root
+
+    def connected(self, room, other):
+        """
+        Merge the components of two rooms, called by ``Room.connect``.
+        """
+        self.add_room(room)
+        self.add_room(other)
+        self._union(self._index[room], self._index[other])
+
+    def _union(self, first, second):
+        first = self._find(first)
+        second = self._find(second)
+        if first == second:
+            return
+        if self._size[first] < self._size[second]:
+            first, second = second, first
+        self._parent[second] = first
+        self._size[first] += self._size[second]
+        self.component_count -= 1
+
+    def same_component(self, room, other):
+        first = self._index.get(room)
+        second = self._index.get(other)
+        if first is None or second is None:
+            return False
+        return self._find(first) == self._find(second)
+
+    def component_size(self, room):
+        node = self._index.get(room)
+        if node is None:
+            return None
+        return self._size[self._find(node)]
+
+    def components(self):
+        """
+        Rooms grouped by connected component, ignoring direction.
+        """
+        groups = {}
+        find = self._find
+        for room, node in self._index.items():
+            groups.setdefault(find(node), []).append(room)
+        return list(groups.values())
+
+    def shortest_path(self, start, goal):
+        """
+        Fewest-connections path from ``start`` to ``goal`` found by BFS.
+
+        Returns:
+            list[Room]: Rooms from start to goal, or None if unreachable.
+        """
+        if start is goal:
+            return [start]
+        # Untracked rooms may still lead to tracked ones: search those.
+        if (start in self._index and goal in self._index
+                and not self.same_component(start, goal)):
+            return None
+        previous = {start: None}
+        frontier = deque([start])
+        while frontier:
+            room = frontier.popleft()
+            for other in room.connected_rooms:
+                if other in previous:
+                    continue
+                previous[other] = room
+                if other is goal:
+                    path = [goal]
+                    while path[-1] is not start:
+                        path.append(previous[path[-1]])
+                    path.reverse()
+                    return path
+                frontier.append(other)
+        return None
+
+    def neighborhood(self, start, hops):
+        """
+        Rooms reachable from ``start`` in at most ``hops`` connections,
+        mapped to their distance.
+        """
+        distances = {start: 0}
+        frontier = [start]
+        for distance in range(1, hops + 1):
+            next_frontier = []
+            for room in frontier:
+                for other in room.connected_rooms:
+                    if other not in distances:
+                        distances[other] = distance
+                        next_frontier.append(other)
+            if not next_frontier:
+                break
+            frontier = next_frontier
+        return distances
+
+    def reachable(self, start):
+        """
+        Set of rooms reachable from ``start``, itself included.
+        """
+        seen = {start}
+        stack = [start]
+        while stack:
+            for other in stack.pop().connected_rooms:
+                if other not in seen:
+                    seen.add(other)
+                    stack.append(other)
+        return seen
 
 
 class MazeGame(ABC):
@@ -33,6 +248,46 @@ class MazeGame(ABC):
     def play(self):
         print("Playing using \"{}\"".format(self.rooms[0]))
 
+    def build_compact(self, width, height, openness=0.5, seed=None):
+        """
+        Generate a ``width`` x ``height`` grid maze as a CompactMaze.
+
+        Each wall between neighbouring rooms is open with probability
+        ``openness``, in steps of 1/256 up to 255/256; open walls connect
+        the rooms both ways. The room kind
+        comes from the ``make_room`` factory method.
+
+        Returns:
+            CompactMaze: The generated maze.
+        """
+        rooms = width * height
+        rng = random.Random(seed)
+        threshold = min(int(openness * 256), 255)
+        # Walls to the right of and below each room, closed (0xff) on the
+        # last column and row so negative and wrapped indices stay closed.
+        right = bytearray(rng.randbytes(rooms))
+        right[width - 1::width] = b"\xff" * height
+        down = bytearray(rng.randbytes(rooms))
+        down[rooms - width:] = b"\xff" * width
+
+        neighbors = array('I')
+        offsets = array('I', [0])
+        add_neighbor = neighbors.append
+        add_offset = offsets.append
+        for room in range(rooms):
+            if down[room - width] < threshold:
+                add_neighbor(room - width)
+            if right[room - 1] < threshold:
+                add_neighbor(room - 1)
+            if right[room] < threshold:
+                add_neighbor(room + 1)
+            if down[room] < threshold:
+                add_neighbor(room + width)
+            add_offset(len(neighbors))
+
+        kinds = [type(self.make_room())]
+        return CompactMaze(kinds, array('B', bytes(rooms)), offsets, neighbors)
+
     @abstractmethod
     def make_room(self):
         raise NotImplementedError("You should implement this!")
@@ -51,11 +306,16 @@ class OrdinaryMazeGame(MazeGame):
 
 
 class Room(ABC):
+    # MazeQuery objects tracking this room, told about every new connection.
+    queries = ()
+
     def __init__(self):
         self.connected_rooms = []
 
     def connect(self, room):
         self.connected_rooms.append(room)
+        for query in self.queries:
+            query.connected(self, room)
 
 
 class MagicRoom(Room):
@@ -69,9 +329,72 @@ class OrdinaryRoom(Room):
 
 
 
-if __concrete_prototype_a_clonename__ == '__main__':
-    ordinaryGame = OrdinaryMazeGame()
-    ordinaryGame.play()
+def benchmark(width=2000, height=1000):
+    game = MagicMazeGame()
+    start = time.perf_counter()
+    maze = game.build_compact(width, height, seed=1)
+    elapsed = time.perf_counter() - start
+    print("Generated {:,} rooms and {:,} connections in {:.2f}s".format(
+        len(maze), len(maze.neighbors), elapsed
+    ))
+    print("Compact: {:.1f} bytes per room".format(maze.memory_per_room()))
+
+    # Object layout of the first rows, measured with tracemalloc.
+    sample = min(len(maze), 100000)
+    tracemalloc.start()
+    rooms = [maze.room(room_id) for room_id in range(sample)]
+    for room_id, room in enumerate(rooms):
+        for other in maze.connected_rooms(room_id):
+            if other < sample:
+                room.connect(rooms[other])
+    used, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print("Objects: {:.1f} bytes per room".format(used / sample))
+
+
+def benchmark_queries(width=500, height=400, queries=100):
+    game = OrdinaryMazeGame()
+    game.rooms = game.build_compact(width, height, seed=1).to_rooms()
+    start = time.perf_counter()
+    query = MazeQuery(game)
+    print("Indexed {:,} rooms into {:,} components in {:.2f}s".format(
+        len(game.rooms), query.component_count, time.perf_counter() - start
+    ))
+
+    rng = random.Random(2)
+    pairs = [(rng.choice(game.rooms), rng.choice(game.rooms))
+             for _ in range(queries)]
+    runs = (
+        ("same_component", lambda: [query.same_component(*p) for p in pairs]),
+        ("shortest_path", lambda: [query.shortest_path(*p) for p in pairs]),
+        ("neighborhood(5)",
+         lambda: [query.neighborhood(p[0], 5) for p in pairs]),
+        ("reachable", lambda: [query.reachable(p[0]) for p in pairs]),
+    )
+    for name, run in runs:
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        print("{:>15}: {:.3f}ms per query".format(
+            name, elapsed / queries * 1000
+        ))
+
+    start = time.perf_counter()
+    for first, second in pairs:
+        first.connect(second)
+    print("connect with incremental components: {:.1f}us, {:,} components"
+          .format((time.perf_counter() - start) / queries * 1e6,
+                  query.component_count))
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ["benchmark"]:
+        benchmark()
+    elif sys.argv[1:] == ["benchmark-queries"]:
+        benchmark_queries()
+    else:
+        ordinaryGame = OrdinaryMazeGame()
+        ordinaryGame.play()
 
-    magicGame = MagicMazeGame()
-    magicGame.play()
+        magicGame = MagicMazeGame()
+        magicGame.play()
@@ -1,34 +1,113 @@
+import os
+import threading
+import time
 import unittest
+import weakref
 from unittest.mock import patch
 
 
 class Singleton:
     # Here will be the instance stored.
     __instance = None
+    # Only taken while the instance does not exist yet.
+    __lock = threading.Lock()
 
     @staticmethod
     def getInstance():
         """ Static access method. """
-        if Singleton.__instance == None:
-            Singleton()
+        instance = Singleton.__instance
+        if instance is not None:
+            return instance
+        with Singleton.__lock:
+            if Singleton.__instance is None:
+                Singleton()
         return Singleton.__instance
 
+    @staticmethod
+    def reset():
+        """ Forget the instance, done in child processes after fork. """
+        Singleton.__lock = threading.Lock()
+        Singleton.__instance = None
+
     def __init__(self):
         """ Virtually private constructor. """
-        if Singleton.__instance != None:
+        if Singleton.__instance is not None:
             raise Exception("This class is a singleton!")
         else:
             self.setInstance()
 
     def setInstance(self):
-        Singleton.__instance = self
+        # Initialize before publishing: getInstance reads the instance
+        # without the lock, so it must never see a half-built one.
         self.foo()
+        Singleton.__instance = self
 
     def foo(self):
         pass
 
 
+class SingletonRegistry:
+    """ Named singletons built lazily, on first access, by their factory. """
+
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self.init_times = {}
+        _registries.add(self)
+
+    def register(self, name, factory):
+        with self._lock:
+            self._factories[name] = factory
+            self._locks[name] = threading.Lock()
+
+    def get(self, name):
+        """ Return the named singleton, building it on the first call. """
+        instance = self._instances.get(name, _MISSING)
+        if instance is not _MISSING:
+            return instance
+        with self._locks[name]:
+            instance = self._instances.get(name, _MISSING)
+            if instance is _MISSING:
+                start = time.perf_counter()
+                instance = self._factories[name]()
+                self.init_times[name] = time.perf_counter() - start
+                self._instances[name] = instance
+        return instance
+
+    def reset(self):
+        """ Forget every instance, done in child processes after fork. """
+        self._lock = threading.Lock()
+        self._locks = {name: threading.Lock() for name in self._factories}
+        self._instances = {}
+        self.init_times = {}
+
+    def slowest(self, count=10):
+        """ Names and initialization times of the slowest singletons. """
+        return sorted(
+            self.init_times.items(), key=lambda item: item[1], reverse=True
+        )[:count]
+
+
+_MISSING = object()
+_registries = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    Singleton.reset()
+    for registry in list(_registries):
+        registry.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
 class SingletonTestCase(unittest.TestCase):
+    def setUp(self):
+        Singleton.reset()
+
     @patch.object(Singleton, 'foo')
     def test_one_instance_only(self, mock_foo):
         try:
@@ -38,6 +117,108 @@ class SingletonTestCase(unittest.TestCase):
             pass
         self.assertEqual(mock_foo.call_count, 1)
 
+    def test_concurrent_first_access(self):
+        ready = threading.Event()
+
+        def initialize():
+            time.sleep(0.01)
+            ready.set()
+
+        barrier = threading.Barrier(8)
+        instances = []
+        initialized = []
+
+        def access():
+            barrier.wait()
+            instances.append(Singleton.getInstance())
+            initialized.append(ready.is_set())
+
+        with patch.object(Singleton, 'foo', side_effect=initialize) as mock_foo:
+            threads = [threading.Thread(target=access) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(mock_foo.call_count, 1)
+        self.assertEqual(len(set(map(id, instances))), 1)
+        self.assertEqual(initialized, [True] * 8)
+
+    def test_fast_path_never_sees_half_built_instance(self):
+        ready = threading.Event()
+        started = threading.Event()
+
+        def initialize():
+            started.set()
+            time.sleep(0.05)
+            ready.set()
+
+        with patch.object(Singleton, 'foo', side_effect=initialize):
+            builder = threading.Thread(target=Singleton.getInstance)
+            builder.start()
+            started.wait()
+            Singleton.getInstance()
+            initialized = ready.is_set()
+            builder.join()
+        self.assertTrue(initialized)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_reset_after_fork(self):
+        parent = Singleton.getInstance()
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if Singleton.getInstance() is not parent else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+        self.assertIs(Singleton.getInstance(), parent)
+
+
+class SingletonRegistryTestCase(unittest.TestCase):
+    def test_lazy_single_build(self):
+        registry = SingletonRegistry()
+        calls = []
+        registry.register("config", lambda: calls.append(1) or object())
+        self.assertEqual(registry.init_times, {})
+        first = registry.get("config")
+        self.assertIs(registry.get("config"), first)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([name for name, _ in registry.slowest()], ["config"])
+
+    def test_concurrent_first_access(self):
+        registry = SingletonRegistry()
+        calls = []
+
+        def factory():
+            calls.append(1)
+            time.sleep(0.01)
+            return object()
+
+        registry.register("db", factory)
+        barrier = threading.Barrier(8)
+        instances = []
+
+        def access():
+            barrier.wait()
+            instances.append(registry.get("db"))
+
+        threads = [threading.Thread(target=access) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(map(id, instances))), 1)
+
+    @unittest.skipUnless(hasattr(os, "fork"), "requires fork")
+    def test_reset_after_fork(self):
+        registry = SingletonRegistry()
+        registry.register("db", object)
+        parent = registry.get("db")
+        pid = os.fork()
+        if pid == 0:
+            os._exit(0 if registry.get("db") is not parent else 1)
+        _, status = os.waitpid(pid, 0)
+        self.assertEqual(os.waitstatus_to_exitcode(status), 0)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -11,6 +11,9 @@
                             ConcreteDecoratorA ConcreteDecoratorB
 '''
 
+import sys
+import timeit
+
 
 class Component:
     def draw(self):
@@ -28,37 +31,167 @@ class ConcreteComponent(Component):
 
 
 class Decorator(Component):
+    # Methods a decorator stack can be fused for, each compiled by
+    # FusedComponent into its "_<name>" attribute.
+    FUSABLE = ("draw", "resize")
+    # Bumped whenever a decorator is rewired or given a hook after
+    # construction, invalidating fused stacks; building new decorators
+    # leaves existing stacks as is.
+    generation = 0
+
     def __init__(self, _component):
-        self._component = _component
+        self._wrapped = _component
+
+    @property
+    def _component(self):
+        return self._wrapped
+
+    @_component.setter
+    def _component(self, component):
+        self._wrapped = component
+        Decorator.generation += 1
+
+    def __setattr__(self, name, value):
+        # Hooks set on an instance are fused too, so setting one rewires.
+        object.__setattr__(self, name, value)
+        if name.startswith(("before_", "after_")) or name in self.FUSABLE:
+            Decorator.generation += 1
 
     def draw(self):
+        self.before_draw()
         self._component.draw()
+        self.after_draw()
 
     def resize(self):
+        self.before_resize()
         self._component.resize()
+        self.after_resize()
+
+    def before_draw(self):
+        pass
+
+    def after_draw(self):
+        pass
+
+    def before_resize(self):
+        pass
+
+    def after_resize(self):
+        pass
+
+    def fuse(self):
+        """
+        Compile this stack into a FusedComponent calling every layer's hooks
+        in order, without one nested call per layer.
+        """
+        return FusedComponent(self)
 
 class ConcreteDecoratorA(Decorator):
 
-    def draw(self):
-        super().draw()
+    def after_draw(self):
         print('with decoratorA')
 
-    def resize(self):
-        super().resize()
+    def after_resize(self):
         print('with decoratorA')
 
 
 class ConcreteDecoratorB(Decorator):
-    def draw(self):
-        super().draw()
+    def after_draw(self):
         print('with decoratorB')
 
-    def resize(self):
-        super().resize()
+    def after_resize(self):
         print('with decoratorB')
 
 
-if __name__ == '__main__':
+def fuse_method(component, name):
+    """
+    Generate a function running ``component.<name>()`` as straight-line
+    calls: the before hooks from the outermost layer in, the innermost
+    method, then the after hooks from the innermost layer out. A layer
+    overriding the method itself, on its class or on the instance, is kept
+    whole as the innermost call.
+    """
+    def overrides(layer, attribute):
+        return (attribute in layer.__dict__
+                or getattr(type(layer), attribute)
+                is not getattr(Decorator, attribute))
+
+    before_name, after_name = "before_" + name, "after_" + name
+    befores, afters = [], []
+    layer = component
+    while isinstance(layer, Decorator) and not overrides(layer, name):
+        if overrides(layer, before_name):
+            befores.append(getattr(layer, before_name))
+        if overrides(layer, after_name):
+            afters.insert(0, getattr(layer, after_name))
+        layer = layer._component
+    calls = befores + [getattr(layer, name)] + afters
+
+    namespace = {"call{}".format(index): call for index, call in enumerate(calls)}
+    source = "def fused():\n" + "".join(
+        "    call{}()\n".format(index) for index in range(len(calls))
+    )
+    exec(source, namespace)
+    return namespace["fused"]
+
+
+class FusedComponent(Component):
+    """
+    Component running a decorator stack through fused methods, compiled
+    again when any decorator has been rewired since.
+    """
+    def __init__(self, component):
+        self._component = component
+        self._compile()
+
+    def _compile(self):
+        self._generation = Decorator.generation
+        for name in Decorator.FUSABLE:
+            setattr(self, "_" + name, fuse_method(self._component, name))
+
+    def draw(self):
+        if self._generation != Decorator.generation:
+            self._compile()
+        self._draw()
+
+    def resize(self):
+        if self._generation != Decorator.generation:
+            self._compile()
+        self._resize()
+
+
+class NullComponent(Component):
+    def draw(self):
+        pass
+
+    def resize(self):
+        pass
+
+
+class NullDecorator(Decorator):
+    def after_draw(self):
+        pass
+
+    def after_resize(self):
+        pass
+
+
+def benchmark(number=100000):
+    for depth in (1, 5, 10, 15, 20):
+        component = NullComponent()
+        for _ in range(depth):
+            component = NullDecorator(component)
+        fused = component.fuse()
+        nested = timeit.timeit(component.draw, number=number)
+        compiled = timeit.timeit(fused.draw, number=number)
+        print("depth {:>2}: {:.2f}us nested, {:.2f}us fused".format(
+            depth, nested / number * 1e6, compiled / number * 1e6
+        ))
+
+
+if __name__ == '__main__' and sys.argv[1:] == ['benchmark']:
+    benchmark()
+elif __name__ == '__main__':
     component = ConcreteComponent() 
     decorator_a = ConcreteDecoratorA(component)
     decorator_a.draw()
@@ -14,47 +14,495 @@
 
 '''
 
+import multiprocessing
+import random
+import sys
+import threading
+import time
+import weakref
+from array import array
+from collections import OrderedDict
+from itertools import islice
+from multiprocessing.shared_memory import SharedMemory
+from operator import mul
+
 
 # Instances of CheeseBrand will be the Flyweights
 class CheeseBrand(object):
+    __slots__ = ('brand', 'cost', '__weakref__')
+
     def __init__(self, brand, cost):
-        self.brand = brand
-        self.cost = cost
-        self._immutable = True   # Disables future attributions
+        # Initial attribution bypasses __setattr__, which disables any other
+        object.__setattr__(self, 'brand', brand)
+        object.__setattr__(self, 'cost', cost)
 
     def __setattr__(self, name, value):
-        if getattr(self, '_immutable', False):  # Allow initial attribution
-            raise RuntimeError('This object is immutable')
+        raise RuntimeError('This object is immutable')
+
+
+class CheeseBrandFactory(object):
+    """Flyweight factory handing out shared CheeseBrand instances.
+
+    Brands are held weakly, so a brand nobody uses any more is freed; the
+    ``lru_size`` most recently used ones are also held strongly so they
+    survive short gaps in use. While anything holds a brand, the factory
+    resolves its name to that same object.
+    """
+
+    def __init__(self, lru_size=1024):
+        self.lru_size = lru_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._brands = weakref.WeakValueDictionary()
+        self._recent = OrderedDict()
+
+    def __len__(self):
+        return len(self._brands)
+
+    def __contains__(self, brand):
+        return brand in self._brands
+
+    def __getitem__(self, brand):
+        cheese = self.get(brand)
+        if cheese is None:
+            raise KeyError(brand)
+        return cheese
+
+    def __setitem__(self, brand, cheese):
+        self._brands[brand] = cheese
+        self._touch(cheese)
+
+    def _touch(self, cheese):
+        if not self.lru_size:
+            return
+        recent = self._recent
+        recent[cheese.brand] = cheese
+        recent.move_to_end(cheese.brand)
+        if len(recent) > self.lru_size:
+            recent.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, brand, default=None):
+        cheese = self._brands.get(brand)
+        if cheese is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self._touch(cheese)
+        return cheese
+
+    def brand(self, brand, cost):
+        """The shared CheeseBrand for ``brand`` at ``cost``, created if no
+        live one has that cost."""
+        cheese = self._brands.get(brand)
+        if cheese is not None and cheese.cost == cost:
+            self.hits += 1
         else:
-            super(CheeseBrand, self).__setattr__(name, value)
-    
+            self.misses += 1
+            cheese = self._brands[brand] = CheeseBrand(brand, cost)
+        self._touch(cheese)
+        return cheese
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'live': len(self._brands)}
+
 
 class CheeseShop(object):
-    menu = {}  # Shared container to access the Flyweights
+    menu = CheeseBrandFactory()  # Shared container to access the Flyweights
+    shops = weakref.WeakSet()  # Shops whose income follows menu costs
     
     def __init__(self):
         self.orders = {}  # per-instance container with private attributes
+        # Flyweights this shop stocked or sold, which keeps them in the menu
+        self.brands = {}
+        # Running totals, updated on every sale and restock
+        self._units = 0
+        self._income = 0
+        self.shops.add(self)
 
     def stock_cheese(self, brand, cost):
-        cheese = CheeseBrand(brand, cost)
-        self.menu[brand] = cheese   # Shared Flyweight
+        old = self.menu.get(brand) if brand in self.menu else None
+        cheese = self.menu.brand(brand, cost)   # Shared Flyweight
+        self.brands[brand] = cheese
+        if old is None:
+            return   # No shop has sold it, so no income to correct
+        delta = cost - (old.cost if old is not None else 0)
+        for shop in list(self.shops):
+            if brand in shop.brands or brand in shop.orders:
+                shop.brands[brand] = cheese
+                units = shop.orders.get(brand)
+                if units and delta:
+                    shop._income += delta * units
+
+    def _cost(self, brand):
+        cheese = self.brands.get(brand)
+        if cheese is None:
+            # KeyError for a brand no live shop has stocked, as total_income
+            # raised before running totals; the sale is not recorded.
+            cheese = self.brands[brand] = self.menu[brand]
+        return cheese.cost
 
     def sell_cheese(self, brand, units):
+        income = self._cost(brand) * units
         self.orders.setdefault(brand, 0)
         self.orders[brand] += units   # Instance attribute
+        self._units += units
+        self._income += income
+
+    def sell_many(self, events, chunk_size=4096):
+        """Record many (brand, units) sales.
+
+        ``events`` is an iterable of pairs or a text stream of "brand units"
+        lines. Events are consumed in chunks summed per brand, so the menu is
+        looked up once per brand and chunk.
+        """
+        if hasattr(events, 'read'):
+            events = (line.split() for line in events if line.strip())
+            events = ((brand, int(units)) for brand, units in events)
+        events = iter(events)
+        orders = self.orders
+        while True:
+            chunk = {}
+            for brand, units in islice(events, chunk_size):
+                chunk[brand] = chunk.get(brand, 0) + units
+            if not chunk:
+                break
+            # Price the whole chunk first, so an unknown brand records none.
+            costs = {brand: self._cost(brand) for brand in chunk}
+            for brand, units in chunk.items():
+                orders[brand] = orders.get(brand, 0) + units
+                self._units += units
+                self._income += costs[brand] * units
 
     def total_units_sold(self):
-        return sum(self.orders.values())
+        return self._units
     
     def total_income(self):
-        income = 0
-        for brand, units in self.orders.items():
-            income += self.menu[brand].cost * units
-        return income
+        return self._income
+
+
+class CheeseStore(object):
+    """Flyweight store keeping brands as interned integer ids, with their
+    costs in one contiguous array indexed by id."""
+
+    def __init__(self):
+        self.ids = {}
+        self.brands = []
+        self.costs = array('d')
+
+    def __len__(self):
+        return len(self.brands)
+
+    def stock(self, brand, cost):
+        brand_id = self.ids.get(brand)
+        if brand_id is None:
+            brand_id = self.ids[brand] = len(self.brands)
+            self.brands.append(brand)
+            self.costs.append(cost)
+        else:
+            self.costs[brand_id] = cost
+        return brand_id
+
+    def brand(self, brand_id):
+        return CheeseBrand(self.brands[brand_id], self.costs[brand_id])
+
+
+class CompactCheeseShop(object):
+    store = CheeseStore()  # Shared store of the Flyweights
+
+    def __init__(self):
+        # Units sold per brand as parallel arrays of brand ids and counts,
+        # since a shop only sells a few brands of a large catalog.
+        self.brand_ids = array('I')
+        self.units = array('q')
+        self._positions = {}
+
+    def stock_cheese(self, brand, cost):
+        self.store.stock(brand, cost)
+
+    def sell_cheese(self, brand, units):
+        brand_id = self.store.ids[brand]
+        position = self._positions.get(brand_id)
+        if position is None:
+            self._positions[brand_id] = len(self.units)
+            self.brand_ids.append(brand_id)
+            self.units.append(units)
+        else:
+            self.units[position] += units
+
+    def total_units_sold(self):
+        return sum(self.units)
+
+    def total_income(self):
+        return sum(map(mul, map(self.store.costs.__getitem__, self.brand_ids),
+                       self.units))
+
+
+class OrderShard(object):
+    """One worker's row of a ShardedOrders block.
+
+    Only its owner writes it, so increments need no lock. The row starts
+    with a sequence number that is odd while a write is in progress.
+    """
+
+    def __init__(self, row, ids):
+        self._row = row
+        self._ids = ids
+
+    def sell_cheese(self, brand, units):
+        row = self._row
+        row[0] += 1
+        row[self._ids[brand] + 1] += units
+        row[0] += 1
+
+    def sell_many(self, events, chunk_size=1024):
+        row = self._row
+        ids = self._ids
+        events = iter(events)
+        while True:
+            chunk = list(islice(events, chunk_size))
+            if not chunk:
+                break
+            # Readers only wait for one chunk, not the whole stream.
+            row[0] += 1
+            for brand, units in chunk:
+                row[ids[brand] + 1] += units
+            row[0] += 1
+
+
+class _ShardLease(object):
+    """A thread's hold on a shard, given back when the thread ends."""
+    __slots__ = ('shard', '__weakref__')
+
+
+class ShardedOrders(object):
+    """Units sold per brand, split into per-worker shards in shared memory.
+
+    The block holds one row of 64-bit counters per shard, for a fixed list
+    of brands. Threads take a shard each with ``local_shard``; processes
+    ``attach`` to the block by name and use ``shard(index)``. ``snapshot``
+    merges the rows, re-reading any row written during the copy.
+    """
+
+    def __init__(self, brands, shards, name=None):
+        self.brands = list(brands)
+        self.shards = shards
+        self._ids = {brand: index for index, brand in enumerate(self.brands)}
+        self._width = len(self.brands) + 1
+        size = shards * self._width * 8
+        if name is None:
+            self._memory = SharedMemory(create=True, size=size)
+            self._memory.buf[:size] = bytes(size)
+        else:
+            self._memory = SharedMemory(name=name)
+        self._counters = self._memory.buf[:size].cast('q')
+        # Index -> OrderShard; their rows are views released by close.
+        self._shards = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._next_shard = 0
+        # Indexes of shards given back by threads that ended.
+        self._free = []
+
+    @property
+    def name(self):
+        return self._memory.name
+
+    @classmethod
+    def attach(cls, name, brands, shards):
+        return cls(brands, shards, name)
+
+    def shard(self, index):
+        shard = self._shards.get(index)
+        if shard is None:
+            start = index * self._width
+            shard = self._shards[index] = OrderShard(
+                self._counters[start:start + self._width], self._ids
+            )
+        return shard
+
+    def local_shard(self):
+        """The calling thread's shard, assigned on its first call and given
+        back when the thread ends. RuntimeError is raised when more than
+        ``shards`` threads hold one at once."""
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            with self._lock:
+                if self._free:
+                    index = self._free.pop()
+                elif self._next_shard == self.shards:
+                    raise RuntimeError('No shard left for this thread')
+                else:
+                    index = self._next_shard
+                    self._next_shard += 1
+            lease = self._local.lease = _ShardLease()
+            lease.shard = self.shard(index)
+            # The thread-local lease dies with its thread.
+            weakref.finalize(lease, self._free.append, index)
+        return lease.shard
+
+    def snapshot(self, timeout=1.0):
+        """Units sold per brand summed over the shards.
+
+        Raises:
+            RuntimeError: A shard stayed mid-write for ``timeout`` seconds,
+                e.g. because its writer process died.
+        """
+        totals = [0] * (self._width - 1)
+        counters = self._counters
+        for index in range(self.shards):
+            start = index * self._width
+            deadline = None
+            while True:
+                sequence = counters[start]
+                if sequence % 2:
+                    if deadline is None:
+                        deadline = time.monotonic() + timeout
+                    elif time.monotonic() > deadline:
+                        raise RuntimeError(
+                            'Shard {} is stuck mid-write'.format(index))
+                    time.sleep(0)
+                    continue
+                row = counters[start + 1:start + self._width].tolist()
+                if counters[start] == sequence:
+                    break
+            totals = list(map(sum, zip(totals, row)))
+        return dict(zip(self.brands, totals))
+
+    def close(self):
+        """Release the shards and the block; shards can no longer be used."""
+        for shard in self._shards.values():
+            shard._row.release()
+        self._shards = {}
+        self._counters.release()
+        self._memory.close()
+
+    def unlink(self):
+        self._memory.unlink()
+
+
+class ShardedCheeseShop(CheeseShop):
+    """CheeseShop whose orders can be fed from many threads at once."""
+
+    def __init__(self, brands, shards):
+        super(ShardedCheeseShop, self).__init__()
+        self.counters = ShardedOrders(brands, shards)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Free the shared memory block of the orders."""
+        self.counters.close()
+        self.counters.unlink()
+
+    def sell_cheese(self, brand, units):
+        self.counters.local_shard().sell_cheese(brand, units)
+
+    def sell_many(self, events):
+        self.counters.local_shard().sell_many(events)
+
+    def snapshot(self):
+        orders = self.counters.snapshot()
+        units = sum(orders.values())
+        income = sum(self._cost(brand) * count
+                     for brand, count in orders.items() if count)
+        return units, income
+
+    def total_units_sold(self):
+        return sum(self.counters.snapshot().values())
+
+    def total_income(self):
+        return self.snapshot()[1]
+
+
+def _sell_in_process(name, brands, shards, index, events):
+    orders = ShardedOrders.attach(name, brands, shards)
+    orders.shard(index).sell_many(events)
+    orders.close()
+
+
+def benchmark_sharded(workers=4, sales=200000, brands=1000):
+    names = ['brand{}'.format(index) for index in range(brands)]
+    rng = random.Random(1)
+    events = [(rng.choice(names), 1) for _ in range(sales)]
+    context = multiprocessing.get_context('fork')
+    for count in range(1, workers + 1):
+        per_worker = sales // count
+        parts = [events[index * per_worker:(index + 1) * per_worker]
+                 for index in range(count)]
+
+        shop = ShardedCheeseShop(names, count)
+        threads = [threading.Thread(target=shop.sell_many, args=(part,))
+                   for part in parts]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        threaded = time.perf_counter() - start
+        assert shop.total_units_sold() == per_worker * count
+
+        orders = shop.counters
+        processes = [
+            context.Process(target=_sell_in_process,
+                            args=(orders.name, names, count, index, part))
+            for index, part in enumerate(parts)
+        ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        forked = time.perf_counter() - start
+        assert shop.total_units_sold() == 2 * per_worker * count
+        shop.close()
+        print("{} workers: {:,.0f} sales/s threads, {:,.0f} sales/s processes"
+              .format(count, per_worker * count / threaded,
+                      per_worker * count / forked))
+
+
+def benchmark(brands=100000, shops=10000, sales=100):
+    rng = random.Random(1)
+    names = ['brand{}'.format(index) for index in range(brands)]
+    costs = [rng.uniform(1, 10) for _ in range(brands)]
+    orders = [[(rng.choice(names), rng.randint(1, 10)) for _ in range(sales)]
+              for _ in range(shops)]
 
+    for shop_class in (CheeseShop, CompactCheeseShop):
+        saved_menu = CheeseShop.menu
+        CheeseShop.menu = CheeseBrandFactory()
+        CompactCheeseShop.store = CheeseStore()
+        stocker = shop_class()
+        for name, cost in zip(names, costs):
+            stocker.stock_cheese(name, cost)
+        start = time.perf_counter()
+        all_shops = []
+        for shop_orders in orders:
+            shop = shop_class()
+            for brand, units in shop_orders:
+                shop.sell_cheese(brand, units)
+            all_shops.append(shop)
+        selling = time.perf_counter() - start
+        start = time.perf_counter()
+        income = sum(shop.total_income() for shop in all_shops)
+        totals = time.perf_counter() - start
+        print("{:>17}: sell {:.2f}s, total_income of all shops {:.3f}s,"
+              " income {:,.2f}".format(
+                  shop_class.__name__, selling, totals, income))
+        CheeseShop.menu = saved_menu
 
 
-if __name__ == '__main__':
+if __name__ == '__main__' and sys.argv[1:] == ['benchmark']:
+    benchmark()
+elif __name__ == '__main__' and sys.argv[1:] == ['benchmark-sharded']:
+    benchmark_sharded()
+elif __name__ == '__main__':
     shop1 = CheeseShop()
     shop2 = CheeseShop()
 
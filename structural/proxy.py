@@ -11,7 +11,22 @@
 
 '''
 
+import itertools
+import multiprocessing
+import os
+import pickle
+import signal
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import threading
+import time
+import unittest
 from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import Future
 
 
 NOT_IMPLEMENTED = "You should implement this."
@@ -36,10 +51,21 @@ class Driver:
 
 
 class ProxyCar(AbstractCar):
-    def __init__(self, driver):
-        self.car = Car()
+    """
+    Protection proxy that is also virtual: the real car is only built on
+    the first permitted call.
+    """
+    def __init__(self, driver, factory=Car):
+        self._car = None
+        self._factory = factory
         self.driver = driver
 
+    @property
+    def car(self):
+        if self._car is None:
+            self._car = self._factory()
+        return self._car
+
     def drive(self):
         if self.driver.age <= 16:
             print("Sorry, the driver is too young to drive.")
@@ -47,10 +73,620 @@ class ProxyCar(AbstractCar):
             self.car.drive()
 
 
-driver = Driver(16)
-car = ProxyCar(driver)
-car.drive()
+class _Call:
+    """
+    In-flight call shared by every caller asking for the same key.
+    """
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        # Whether the leader got a result or an exception, rather than being
+        # interrupted, for instance by KeyboardInterrupt.
+        self.finished = False
+        # Cleared by invalidate while the call runs: its result may predate
+        # the change, so it is returned but not cached.
+        self.cacheable = True
+
+
+class CachingProxy:
+    """
+    Proxy memoizing the method results of any subject by arguments.
+
+    Entries expire after ``ttl`` seconds (never if None) and the least
+    recently used ones are evicted beyond ``maxsize`` (never if None). Concurrent calls with
+    the same arguments are coalesced: only the first reaches the subject,
+    the others wait for its result. Exceptions are shared with the waiting
+    callers but never cached. Calls whose arguments are unhashable bypass
+    the cache.
+    """
+    def __init__(self, subject, ttl=None, maxsize=1024):
+        self._subject = subject
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.uncacheable = 0
+
+    def __getattr__(self, name):
+        attribute = getattr(self._subject, name)
+        if not callable(attribute):
+            return attribute
+
+        def cached(*args, **kwargs):
+            return self._call(name, attribute, args, kwargs)
+        return cached
+
+    def _call(self, name, method, args, kwargs):
+        try:
+            key = (name, args, frozenset(kwargs.items()))
+            hash(key)
+        except TypeError:
+            with self._lock:
+                self.uncacheable += 1
+            return method(*args, **kwargs)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._cache.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._cache[key]
+                self.expirations += 1
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.misses += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if not call.finished:
+                # The leader was interrupted: try again, possibly as leader.
+                return self._call(name, method, args, kwargs)
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = method(*args, **kwargs)
+            call.finished = True
+        except Exception as error:
+            call.error = error
+            call.finished = True
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+                if call.finished and call.error is None and call.cacheable:
+                    expires = (None if self.ttl is None
+                               else time.monotonic() + self.ttl)
+                    self._cache[key] = (call.result, expires)
+                    if (self.maxsize is not None
+                            and len(self._cache) > self.maxsize):
+                        self._cache.popitem(last=False)
+                        self.evictions += 1
+            call.done.set()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def invalidate(self, name=None, *args, **kwargs):
+        """
+        Drop every cached result, those of one method, or one call when
+        arguments are given. Matching calls still running are detached:
+        their results are not cached and later callers do not wait for them.
+        """
+        with self._lock:
+            if name is None:
+                self._cache.clear()
+                calls = list(self._calls)
+            elif args or kwargs:
+                key = (name, args, frozenset(kwargs.items()))
+                self._cache.pop(key, None)
+                calls = [key] if key in self._calls else []
+            else:
+                for key in [key for key in self._cache if key[0] == name]:
+                    del self._cache[key]
+                calls = [key for key in self._calls if key[0] == name]
+            for key in calls:
+                self._calls.pop(key).cacheable = False
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits, "misses": self.misses,
+                "coalesced": self.coalesced, "evictions": self.evictions,
+                "expirations": self.expirations,
+                "uncacheable": self.uncacheable, "size": len(self._cache),
+            }
+
+
+# Remote proxy frames: 4-byte big-endian length, then a pickled message.
+# Requests are (id, [(method, args, kwargs), ...]), responses are
+# (id, [(ok, value or exception), ...]).
+FRAME = struct.Struct("!I")
+
+
+def _frame(message):
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    return FRAME.pack(len(data)) + data
+
+
+def _read_frames(buffer):
+    """
+    Pop the complete frames at the start of a bytearray.
+    """
+    messages = []
+    offset = 0
+    while len(buffer) - offset >= FRAME.size:
+        size, = FRAME.unpack_from(buffer, offset)
+        end = offset + FRAME.size + size
+        if len(buffer) < end:
+            break
+        messages.append(pickle.loads(buffer[offset + FRAME.size:end]))
+        offset = end
+    del buffer[:offset]
+    return messages
+
+
+def _invoke(subject, name, args, kwargs):
+    try:
+        return True, getattr(subject, name)(*args, **kwargs)
+    except Exception as error:
+        try:
+            pickle.dumps(error)
+        except Exception:
+            error = RuntimeError(repr(error))
+        return False, error
+
+
+def _serve_connection(subject, connection):
+    buffer = bytearray()
+    with connection:
+        while True:
+            try:
+                data = connection.recv(1 << 16)
+            except OSError:
+                return
+            if not data:
+                return
+            buffer += data
+            # Every request already received is answered in one write.
+            responses = [
+                _frame((request_id, [
+                    _invoke(subject, name, args, kwargs)
+                    for name, args, kwargs in calls
+                ]))
+                for request_id, calls in _read_frames(buffer)
+            ]
+            if responses:
+                try:
+                    connection.sendall(b"".join(responses))
+                except OSError:
+                    # The client went away with requests in flight.
+                    return
+
+
+def serve(subject, path, ready=None, stop=None):
+    """
+    Serve the methods of ``subject`` on a Unix socket, one thread per
+    connection. Meant to run in its own process.
+
+    A socket left at ``path`` by a previous server is replaced. The server
+    runs until ``stop`` is set, if given, or the process exits; then the
+    listener is closed and ``path`` unlinked.
+    """
+    if os.path.exists(path) and stat.S_ISSOCK(os.stat(path).st_mode):
+        os.unlink(path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+        server.listen()
+        if stop is not None:
+            # Wake up regularly to check the stop event.
+            server.settimeout(0.1)
+        if ready is not None:
+            ready.set()
+        while stop is None or not stop.is_set():
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                continue
+            threading.Thread(
+                target=_serve_connection, args=(subject, connection),
+                daemon=True
+            ).start()
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.unlink(path)
+
+
+def _serve_process(subject, path, ready):
+    # Turn terminate() into SystemExit, so serve cleans up its socket.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    serve(subject, path, ready)
+
+
+class RemoteProxy:
+    """
+    Proxy forwarding method calls to a subject served by ``serve`` in
+    another local process.
+
+    Plain calls wait for their answer. ``submit`` pipelines calls: it sends
+    the request and returns a Future, so many calls can be in flight on the
+    one connection. ``batch`` sends several calls in a single request.
+    """
+    def __init__(self, path):
+        self._socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._socket.connect(path)
+        self._ids = itertools.count()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._reader = threading.Thread(target=self._read, daemon=True)
+        self._reader.start()
+
+    def __getattr__(self, name):
+        def remote(*args, **kwargs):
+            return self.submit(name, *args, **kwargs).result()
+        return remote
+
+    def _send(self, calls):
+        future = Future()
+        with self._lock:
+            request_id = next(self._ids)
+            self._pending[request_id] = future
+            self._socket.sendall(_frame((request_id, calls)))
+        return future
+
+    def _read(self):
+        buffer = bytearray()
+        while True:
+            try:
+                data = self._socket.recv(1 << 16)
+            except OSError:
+                data = b""
+            if not data:
+                break
+            buffer += data
+            for request_id, results in _read_frames(buffer):
+                self._pending.pop(request_id).set_result(results)
+        error = ConnectionError("Remote subject disconnected.")
+        for future in list(self._pending.values()):
+            future.set_exception(error)
+
+    def submit(self, name, *args, **kwargs):
+        """
+        Send one call without waiting; the Future holds its result.
+        """
+        result = Future()
+
+        def unpack(future):
+            if future.exception() is not None:
+                result.set_exception(future.exception())
+                return
+            (ok, value), = future.result()
+            if ok:
+                result.set_result(value)
+            else:
+                result.set_exception(value)
+        self._send([(name, args, kwargs)]).add_done_callback(unpack)
+        return result
+
+    def batch(self, calls):
+        """
+        Run ``(method, args, kwargs)`` calls in one round trip and return
+        their results; the first failed call raises.
+        """
+        results = self._send([
+            (name, tuple(args), dict(kwargs)) for name, args, kwargs in calls
+        ]).result()
+        values = []
+        for ok, value in results:
+            if not ok:
+                raise value
+            values.append(value)
+        return values
+
+    def close(self):
+        self._socket.close()
+
+
+def start_server(subject, path):
+    """
+    Run ``serve`` in a forked process and wait until it listens. Stop it
+    with ``terminate()``, which closes the listener and unlinks ``path``.
+    """
+    context = multiprocessing.get_context("fork")
+    ready = context.Event()
+    process = context.Process(
+        target=_serve_process, args=(subject, path, ready), daemon=True
+    )
+    process.start()
+    ready.wait()
+    return process
+
+
+class SlowCar(AbstractCar):
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+
+    def drive(self, distance=1):
+        self.calls += 1
+        if self.delay:
+            time.sleep(self.delay)
+        return "Driven {} km".format(distance)
+
+
+class CachingProxyTestCase(unittest.TestCase):
+    def test_memoizes_by_arguments(self):
+        car = SlowCar(0)
+        proxy = CachingProxy(car)
+        self.assertEqual(proxy.drive(5), "Driven 5 km")
+        self.assertEqual(proxy.drive(5), "Driven 5 km")
+        self.assertEqual(proxy.drive(distance=5), "Driven 5 km")
+        self.assertEqual(car.calls, 2)
+        self.assertEqual(proxy.stats()["hits"], 1)
+
+    def test_ttl_and_lru(self):
+        car = SlowCar(0)
+        proxy = CachingProxy(car, ttl=0.01, maxsize=2)
+        proxy.drive(1)
+        time.sleep(0.02)
+        proxy.drive(1)
+        self.assertEqual(proxy.expirations, 1)
+        proxy.drive(2)
+        proxy.drive(3)
+        self.assertEqual(proxy.evictions, 1)
+        proxy.drive(1)
+        self.assertEqual(car.calls, 5)
+
+    def test_single_flight(self):
+        car = SlowCar(0.05)
+        proxy = CachingProxy(car)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(proxy.drive(7)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(car.calls, 1)
+        self.assertEqual(results, ["Driven 7 km"] * 8)
+        self.assertEqual(proxy.coalesced, 7)
+
+    def test_invalidate(self):
+        car = SlowCar(0)
+        proxy = CachingProxy(car)
+        proxy.drive(1)
+        proxy.drive(2)
+        proxy.invalidate("drive", 1)
+        proxy.drive(2)
+        self.assertEqual(car.calls, 2)
+        proxy.drive(1)
+        proxy.invalidate()
+        proxy.drive(2)
+        self.assertEqual(car.calls, 4)
+
+    def test_errors_are_not_cached(self):
+        car = SlowCar(0)
+        car.drive = lambda distance: 1 / distance
+        proxy = CachingProxy(car)
+        with self.assertRaises(ZeroDivisionError):
+            proxy.drive(0)
+        with self.assertRaises(ZeroDivisionError):
+            proxy.drive(0)
+        self.assertEqual(proxy.misses, 2)
+
+    def test_invalidate_during_call_is_not_cached(self):
+        car = SlowCar(0)
+        started = threading.Event()
+        release = threading.Event()
+        backend = ["old"]
+
+        def drive(distance):
+            value = backend[0]
+            started.set()
+            release.wait()
+            return value
+
+        car.drive = drive
+        proxy = CachingProxy(car)
+        thread = threading.Thread(target=proxy.drive, args=(1,))
+        thread.start()
+        started.wait()
+        backend[0] = "new"
+        proxy.invalidate("drive", 1)
+        release.set()
+        thread.join()
+        self.assertEqual(proxy.drive(1), "new")
+
+    def test_unbounded_maxsize(self):
+        proxy = CachingProxy(SlowCar(0), maxsize=None)
+        for distance in range(5):
+            proxy.drive(distance)
+        self.assertEqual(proxy.stats()["size"], 5)
+
+    def test_unhashable_arguments_bypass_cache(self):
+        car = SlowCar(0)
+        car.drive = lambda distances: sum(distances)
+        proxy = CachingProxy(car)
+        self.assertEqual(proxy.drive([1, 2]), 3)
+        self.assertEqual(proxy.drive([1, 2]), 3)
+        self.assertEqual(proxy.uncacheable, 2)
+        self.assertEqual(proxy.stats()["size"], 0)
+
+    def test_interrupted_leader_releases_waiters(self):
+        car = SlowCar(0)
+        started = threading.Event()
+        release = threading.Event()
+
+        def drive(distance):
+            started.set()
+            release.wait()
+            if not car.calls:
+                car.calls += 1
+                raise KeyboardInterrupt
+            return distance
+
+        car.drive = drive
+        proxy = CachingProxy(car)
+        results = []
+        follower = threading.Thread(
+            target=lambda: results.append(proxy.drive(4))
+        )
+
+        def lead():
+            try:
+                proxy.drive(4)
+            except KeyboardInterrupt:
+                pass
+
+        leader = threading.Thread(target=lead)
+        leader.start()
+        started.wait()
+        follower.start()
+        while not proxy.coalesced:
+            time.sleep(0.001)
+        release.set()
+        leader.join()
+        follower.join(5)
+        self.assertEqual(results, [4])
+        self.assertEqual(proxy._calls, {})
+
+
+class VirtualProxyTestCase(unittest.TestCase):
+    def test_refused_driver_never_builds_car(self):
+        built = []
+        proxy = ProxyCar(Driver(16), factory=lambda: built.append(1) or Car())
+        proxy.drive()
+        self.assertEqual(built, [])
+
+    def test_car_built_once_on_first_permitted_call(self):
+        cars = []
+        proxy = ProxyCar(Driver(25), factory=lambda: cars.append(SlowCar(0))
+                         or cars[-1])
+        proxy.drive()
+        proxy.drive()
+        self.assertEqual(len(cars), 1)
+        self.assertEqual(cars[0].calls, 2)
+
+
+class RemoteProxyTestCase(unittest.TestCase):
+    def setUp(self):
+        self.path = os.path.join(tempfile.mkdtemp(), "car.sock")
+        self.server = start_server(SlowCar(0), self.path)
+        self.proxy = RemoteProxy(self.path)
+
+    def tearDown(self):
+        self.proxy.close()
+        self.server.terminate()
+        self.server.join()
+
+    def test_sync_call(self):
+        self.assertEqual(self.proxy.drive(3), "Driven 3 km")
+        self.assertEqual(self.proxy.drive(distance=4), "Driven 4 km")
+
+    def test_pipelined_calls_keep_their_results(self):
+        futures = [self.proxy.submit("drive", index) for index in range(200)]
+        self.assertEqual(
+            [future.result() for future in futures],
+            ["Driven {} km".format(index) for index in range(200)]
+        )
+
+    def test_batch(self):
+        self.assertEqual(
+            self.proxy.batch([("drive", (1,), {}), ("drive", (), {"distance": 2})]),
+            ["Driven 1 km", "Driven 2 km"]
+        )
+
+    def test_remote_errors_are_raised(self):
+        with self.assertRaises(AttributeError):
+            self.proxy.fly()
+        with self.assertRaises(TypeError):
+            self.proxy.batch([("drive", (1,), {}), ("drive", (1, 2), {})])
+
+    def test_restart_on_same_path(self):
+        self.proxy.close()
+        self.server.terminate()
+        self.server.join()
+        self.assertFalse(os.path.exists(self.path))
+        self.server = start_server(SlowCar(0), self.path)
+        self.proxy = RemoteProxy(self.path)
+        self.assertEqual(self.proxy.drive(5), "Driven 5 km")
+
+    def test_stop_closes_listener(self):
+        path = os.path.join(tempfile.mkdtemp(), "stop.sock")
+        ready, stop = threading.Event(), threading.Event()
+        thread = threading.Thread(
+            target=serve, args=(SlowCar(0), path, ready, stop)
+        )
+        thread.start()
+        ready.wait()
+        stop.set()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertFalse(os.path.exists(path))
+
+
+def benchmark_remote(calls=20000, batch_size=100):
+    path = os.path.join(tempfile.mkdtemp(), "car.sock")
+    server = start_server(SlowCar(0), path)
+    proxy = RemoteProxy(path)
+
+    start = time.perf_counter()
+    for index in range(calls):
+        proxy.drive(index)
+    sync = time.perf_counter() - start
+
+    start = time.perf_counter()
+    futures = [proxy.submit("drive", index) for index in range(calls)]
+    for future in futures:
+        future.result()
+    pipelined = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for first in range(0, calls, batch_size):
+        proxy.batch([("drive", (index,), {})
+                     for index in range(first, first + batch_size)])
+    batched = time.perf_counter() - start
+
+    proxy.close()
+    server.terminate()
+    server.join()
+    for name, elapsed in (("sync", sync), ("pipelined", pipelined),
+                          ("batched", batched)):
+        print("{:>9}: {:.1f}us per call, {:,.0f} calls/s".format(
+            name, elapsed / calls * 1e6, calls / elapsed
+        ))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ["test"]:
+        unittest.main(argv=sys.argv[:1] + sys.argv[2:])
+    elif sys.argv[1:] == ["benchmark"]:
+        benchmark_remote()
+        sys.exit()
+
+    driver = Driver(16)
+    car = ProxyCar(driver)
+    car.drive()
 
-driver = Driver(25)
-car = ProxyCar(driver)
-car.drive()
+    driver = Driver(25)
+    car = ProxyCar(driver)
+    car.drive()